@@ -0,0 +1,603 @@
+"""
+Benchmarks for the degrees search engines and data structures.
+
+Usage: python benchmark.py engines [directory] [--queries N] [--compact]
+       python benchmark.py memory [directory] [--queries N]
+       python benchmark.py startup [directory]
+       python benchmark.py names [directory] [--queries N]
+       python benchmark.py paths [directory] [--queries N] [--limit N]
+       python benchmark.py ingest [directory]
+       python benchmark.py cache [directory] [--queries N] [--cache-mb MB]
+       python benchmark.py parallel [directory] [--queries N]
+                                        [--workers N ...]
+       python benchmark.py frontier [size ...]
+       python benchmark.py node [--count N]
+
+`directory` may also be "synthetic:PEOPLE" to generate a random cast
+graph of that many people in a temporary directory.
+"""
+
+import argparse
+import csv
+import itertools
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import degrees
+import graph
+import nameindex
+import util
+
+
+# Largest size the original list-copying frontiers are timed at
+LINEAR_FRONTIER_LIMIT = 10 ** 5
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    engines = commands.add_parser(
+        "engines", help="compare search engines on random pairs")
+    engines.add_argument("directory", nargs="?", default="small")
+    engines.add_argument("--queries", type=int, default=20)
+    engines.add_argument("--compact", action="store_true")
+
+    memory = commands.add_parser(
+        "memory", help="compare dict and compact layouts")
+    memory.add_argument("directory", nargs="?", default="small")
+    memory.add_argument("--queries", type=int, default=20)
+
+    startup = commands.add_parser(
+        "startup", help="time cold (CSV) and warm (snapshot) loads")
+    startup.add_argument("directory", nargs="?", default="small")
+
+    cache = commands.add_parser(
+        "cache", help="hot-source workload with and without tree cache")
+    cache.add_argument("directory", nargs="?", default="small")
+    cache.add_argument("--queries", type=int, default=200)
+    cache.add_argument("--cache-mb", type=float, default=64)
+    cache.add_argument("--compact", action="store_true")
+
+    parallel = commands.add_parser(
+        "parallel", help="scale the parallel engine across workers")
+    parallel.add_argument("directory", nargs="?", default="small")
+    parallel.add_argument("--queries", type=int, default=10)
+    parallel.add_argument("--workers", type=int, nargs="+",
+                          default=[1, 2, 4, 8])
+
+    ingest = commands.add_parser(
+        "ingest", help="load throughput and peak RSS per layout")
+    ingest.add_argument("directory", nargs="?", default="small")
+    ingest.add_argument("--layout", choices=["dict", "compact"],
+                        help=argparse.SUPPRESS)
+
+    names = commands.add_parser(
+        "names", help="name index build time and query latency")
+    names.add_argument("directory", nargs="?", default="small")
+    names.add_argument("--queries", type=int, default=1000)
+
+    paths = commands.add_parser(
+        "paths", help="shortest path enumeration and bounded search")
+    paths.add_argument("directory", nargs="?", default="small")
+    paths.add_argument("--queries", type=int, default=20)
+    paths.add_argument("--limit", type=int, default=1000,
+                       help="most paths enumerated per query")
+    paths.add_argument("--compact", action="store_true")
+
+    frontier = commands.add_parser(
+        "frontier", help="time frontier add / contains_state / remove")
+    frontier.add_argument("sizes", nargs="*", type=int,
+                          default=[10 ** 5, 10 ** 6])
+
+    node = commands.add_parser("node", help="measure search node memory")
+    node.add_argument("--count", type=int, default=10 ** 5)
+
+    args = parser.parse_args()
+    if args.command == "frontier":
+        benchmark_frontiers(args.sizes)
+    elif args.command == "node":
+        benchmark_nodes(args.count)
+    elif args.command == "parallel":
+        with dataset(args.directory) as path:
+            degrees.load_data(path, compact=True, snapshot=False)
+            benchmark_parallel(with_self_pairs(random_pairs(args.queries)),
+                               args.workers)
+    elif args.command == "cache":
+        with dataset(args.directory) as path:
+            degrees.load_data(path, compact=args.compact, snapshot=False)
+            benchmark_tree_cache(args.queries, args.cache_mb)
+    elif args.command == "ingest":
+        if args.layout:
+            load_once(args.directory, args.layout == "compact")
+        else:
+            with dataset(args.directory) as path:
+                benchmark_ingest(path)
+    elif args.command == "paths":
+        with dataset(args.directory) as path:
+            degrees.load_data(path, compact=args.compact, snapshot=False)
+            benchmark_paths(random_pairs(args.queries), args.limit)
+    elif args.command == "names":
+        with dataset(args.directory) as path:
+            degrees.load_data(path, compact=True, snapshot=False)
+            benchmark_names(args.queries)
+    elif args.command == "startup":
+        with dataset(args.directory) as path:
+            benchmark_startup(path)
+    elif args.command == "memory":
+        with dataset(args.directory) as path:
+            benchmark_layouts(path, args.queries)
+    else:
+        with dataset(args.directory) as path:
+            start = time.perf_counter()
+            degrees.load_data(path, compact=args.compact, snapshot=False)
+            print(f"Loaded {len(degrees.people)} people, "
+                  f"{len(degrees.movies)} movies "
+                  f"in {time.perf_counter() - start:.2f}s")
+            compare_engines(with_self_pairs(random_pairs(args.queries)))
+
+
+def benchmark_parallel(pairs, worker_counts):
+    """
+    Times the parallel engine at each worker count against the serial
+    bidirectional and BFS engines, checking all path lengths agree.
+    """
+    expected = []
+    for engine in ("bidirectional", "bfs"):
+        start = time.perf_counter()
+        lengths = []
+        for source, target in pairs:
+            path = degrees.shortest_path(source, target, engine=engine)
+            check_path(source, target, path)
+            lengths.append(None if path is None else len(path))
+        if expected and lengths != expected:
+            raise AssertionError(f"{engine} path lengths differ")
+        expected = lengths
+        print(f"{engine:<15}"
+              f"{1000 * (time.perf_counter() - start) / len(pairs):>10.1f}"
+              f" ms/query")
+
+    for workers in worker_counts:
+        with degrees.enable_parallel(workers):
+            start = time.perf_counter()
+            lengths = []
+            for source, target in pairs:
+                path = degrees.shortest_path(
+                    source, target, engine="parallel")
+                check_path(source, target, path)
+                lengths.append(None if path is None else len(path))
+            seconds = time.perf_counter() - start
+        degrees.parallel_search = None
+        if lengths != expected:
+            raise AssertionError(f"{workers} workers: path lengths differ")
+        print(f"parallel x{workers:<6}"
+              f"{1000 * seconds / len(pairs):>10.1f} ms/query")
+
+
+def benchmark_tree_cache(queries, cache_mb, hot=10, seed=50):
+    """
+    Runs a workload where most sources come from `hot` popular people,
+    without and with the tree cache, checking the path lengths agree.
+    """
+    rng = random.Random(seed)
+    person_ids = sorted(degrees.people)
+    hot_ids = rng.sample(person_ids, hot)
+    pairs = [(rng.choice(hot_ids) if rng.random() < 0.8
+              else rng.choice(person_ids), rng.choice(person_ids))
+             for _ in range(queries)]
+
+    lengths = {}
+    for cached in (False, True):
+        degrees.tree_cache = None
+        if cached:
+            degrees.enable_tree_cache(int(cache_mb * 2 ** 20))
+        start = time.perf_counter()
+        lengths[cached] = []
+        for source, target in pairs:
+            path = degrees.shortest_path(source, target)
+            check_path(source, target, path)
+            lengths[cached].append(None if path is None else len(path))
+        seconds = time.perf_counter() - start
+        print(f"{'cached' if cached else 'uncached':<10}"
+              f"{1000 * seconds / queries:>10.3f} ms/query")
+    print(f"tree cache: {degrees.tree_cache.stats()}")
+    degrees.tree_cache = None
+    if lengths[False] != lengths[True]:
+        raise AssertionError("cached paths differ in length")
+
+
+def benchmark_ingest(path):
+    """
+    Loads each layout from CSV in a fresh process, so peak RSS covers
+    that load alone, and prints throughput and peak RSS.
+    """
+    print(f"{'layout':<10}{'rows':>10}{'load s':>9}{'rows/s':>11}"
+          f"{'peak RSS MiB':>14}")
+    for layout in ("dict", "compact"):
+        subprocess.run([sys.executable, __file__, "ingest", path,
+                        "--layout", layout], check=True)
+
+
+def load_once(path, compact):
+    degrees.load_data(path, compact=compact, snapshot=False)
+    stats = degrees.load_stats
+    peak = stats["peak_rss_mib"]
+    print(f"{'compact' if compact else 'dict':<10}{stats['rows']:>10}"
+          f"{stats['seconds']:>9.2f}"
+          f"{stats['rows'] / max(stats['seconds'], 1e-9):>11.0f}"
+          f"{'n/a' if peak is None else f'{peak:.1f}':>14}")
+
+
+def benchmark_paths(pairs, limit):
+    """
+    For each connected pair at distance d, times the first shortest
+    path, enumerating up to `limit` of them, a search bounded at d - 1
+    (which must find nothing), and enumerating up to `limit` paths of
+    at most d + 1 steps, checking every path along the way.
+    """
+    timings = {"first": 0.0, "all": 0.0, "bounded": 0.0, "within": 0.0}
+    counts = {"all": 0, "within": 0}
+    connected = 0
+    for source, target in pairs:
+        expected = degrees.shortest_path(source, target)
+        if expected is None:
+            continue
+        connected += 1
+        d = len(expected)
+
+        start = time.perf_counter()
+        first = next(degrees.all_shortest_paths(source, target))
+        timings["first"] += time.perf_counter() - start
+        start = time.perf_counter()
+        shortest = list(itertools.islice(
+            degrees.all_shortest_paths(source, target), limit))
+        timings["all"] += time.perf_counter() - start
+        counts["all"] += len(shortest)
+        for path in shortest + [first]:
+            check_path(source, target, path)
+            if len(path) != d:
+                raise AssertionError("enumerated path is not shortest")
+        if len(set(map(tuple, shortest))) != len(shortest):
+            raise AssertionError("duplicate shortest paths")
+
+        start = time.perf_counter()
+        if d and list(degrees.all_shortest_paths(source, target, d - 1)):
+            raise AssertionError("bounded search found a path too long")
+        timings["bounded"] += time.perf_counter() - start
+
+        start = time.perf_counter()
+        within = list(itertools.islice(
+            degrees.paths_within(source, target, d + 1), limit))
+        timings["within"] += time.perf_counter() - start
+        counts["within"] += len(within)
+        for path in within:
+            check_path(source, target, path)
+            if len(path) > d + 1:
+                raise AssertionError("path exceeds the depth bound")
+        if len(within) < limit and not {
+                tuple(path) for path in shortest} <= set(map(tuple, within)):
+            raise AssertionError("paths_within missed a shortest path")
+
+    if not connected:
+        print("no connected pairs")
+        return
+    print(f"{connected} connected pairs")
+    for name, seconds in timings.items():
+        print(f"{name:<9}{1000 * seconds / connected:>10.3f} ms/query"
+              + (f"{counts[name] / connected:>10.1f} paths/query"
+                 if name in counts else ""))
+
+
+def benchmark_names(queries, seed=50):
+    """
+    Times building the NameIndex, then prefix queries on name starts
+    and fuzzy queries on names with one character dropped, reporting
+    how often the intended person ranks first.
+    """
+    rng = random.Random(seed)
+    start = time.perf_counter()
+    index = nameindex.NameIndex(degrees.names)
+    print(f"built index over {len(index.keys)} names "
+          f"in {time.perf_counter() - start:.2f}s")
+
+    names = [rng.choice(index.keys) for _ in range(queries)]
+    prefixes = [name[:max(3, len(name) // 2)] for name in names]
+    typos = []
+    for name in names:
+        i = rng.randrange(len(name))
+        typos.append(name[:i] + name[i + 1:])
+
+    for label, texts, search in (
+            ("prefix", prefixes, index.prefix),
+            ("fuzzy", typos, index.fuzzy),
+            ("search", typos, index.search)):
+        start = time.perf_counter()
+        results = [search(text) for text in texts]
+        seconds = time.perf_counter() - start
+        if label == "prefix":
+            found = sum(name in result
+                        for name, result in zip(names, results))
+        elif label == "fuzzy":
+            found = sum(bool(result) and result[0][1] == name
+                        for name, result in zip(names, results))
+        else:
+            found = sum(bool(result) and result[0][2] == name
+                        for name, result in zip(names, results))
+        print(f"{label:<8}{1000 * seconds / queries:>8.3f} ms/query"
+              f"{100 * found / queries:>8.1f}% intended name found")
+
+
+def benchmark_startup(path):
+    """
+    Times a cold compact load that parses the CSVs and writes the
+    snapshot, then a warm load from the snapshot, then checks that
+    touching a CSV makes the snapshot stale.
+    """
+    snapshot = os.path.join(path, graph.SNAPSHOT_NAME)
+    if os.path.exists(snapshot):
+        os.remove(snapshot)
+    for run in ("cold", "warm"):
+        degrees.load_data(path, compact=True)
+        print(f"{run}: {degrees.load_stats['seconds']:.3f}s "
+              f"from {degrees.load_stats['source']}")
+    print(f"snapshot size: {os.path.getsize(snapshot) / 2 ** 20:.1f} MiB")
+
+    stars = os.path.join(path, "stars.csv")
+    stat = os.stat(stars)
+    os.utime(stars, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1))
+    degrees.load_data(path, compact=True)
+    print(f"after touching stars.csv: loaded from "
+          f"{degrees.load_stats['source']}")
+    os.utime(stars, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    os.remove(snapshot)
+
+
+def benchmark_layouts(path, queries):
+    """
+    Loads the data as dictionaries and as a CompactGraph, printing the
+    memory each layout holds, the time to iterate every person's
+    neighbors, and the bidirectional search latency.
+    """
+    print(f"{'layout':<10}{'load s':>9}{'MiB':>9}"
+          f"{'neighbors s':>13}{'ms/query':>10}")
+    for compact in (False, True):
+        degrees.load_data(path)  # release the previous layout
+        degrees.people = degrees.movies = None
+        degrees.names.clear()
+
+        tracemalloc.start()
+        start = time.perf_counter()
+        degrees.load_data(path, compact=compact, snapshot=False)
+        loaded = time.perf_counter()
+        size, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        if compact:
+            compact_graph = degrees.graph
+            start_iter = time.perf_counter()
+            for person in range(len(compact_graph)):
+                for _ in compact_graph.neighbors(person):
+                    pass
+        else:
+            start_iter = time.perf_counter()
+            for person_id in degrees.people:
+                for _ in degrees._neighbors(person_id):
+                    pass
+        iterated = time.perf_counter()
+
+        pairs = random_pairs(queries)
+        start_search = time.perf_counter()
+        for source, target in pairs:
+            degrees.shortest_path(source, target)
+        searched = time.perf_counter()
+
+        print(f"{'compact' if compact else 'dict':<10}"
+              f"{loaded - start:>9.2f}{size / 2 ** 20:>9.1f}"
+              f"{iterated - start_iter:>13.2f}"
+              f"{1000 * (searched - start_search) / len(pairs):>10.3f}")
+
+
+def compare_engines(pairs):
+    """
+    Runs every engine on the same pairs, checking that they agree on
+    path length, and prints expanded nodes and latency per engine.
+    """
+    engines = [engine for engine in degrees.ENGINES
+               if engine != "parallel" or degrees.parallel_search]
+    totals = {engine: [0, 0.0] for engine in engines}
+    for source, target in pairs:
+        lengths = set()
+        for engine in engines:
+            start = time.perf_counter()
+            path = degrees.shortest_path(source, target, engine=engine)
+            totals[engine][1] += time.perf_counter() - start
+            totals[engine][0] += degrees.search_stats["expanded"]
+            check_path(source, target, path)
+            lengths.add(None if path is None else len(path))
+        if len(lengths) != 1:
+            raise AssertionError(
+                f"engines disagree on {source} -> {target}: {lengths}")
+
+    print(f"{'engine':<15}{'expanded/query':>16}{'ms/query':>12}")
+    for engine, (expanded, seconds) in totals.items():
+        print(f"{engine:<15}{expanded / len(pairs):>16.1f}"
+              f"{1000 * seconds / len(pairs):>12.3f}")
+
+
+def benchmark_frontiers(sizes, lookups=1000):
+    """
+    Fills each frontier class with `size` nodes, probes contains_state
+    `lookups` times, then drains it, printing the time of each phase.
+    """
+    classes = [
+        util.StackFrontier, util.QueueFrontier,
+        util.HashedStackFrontier, util.HashedQueueFrontier,
+    ]
+    print(f"{'frontier':<22}{'size':>9}{'add s':>9}"
+          f"{'contains s':>12}{'remove s':>10}")
+    for size in sizes:
+        probes = [random.randrange(2 * size) for _ in range(lookups)]
+        for cls in classes:
+            name = cls.__name__
+            if not name.startswith("Hashed") and size > LINEAR_FRONTIER_LIMIT:
+                print(f"{name:<22}{size:>9}   skipped (quadratic)")
+                continue
+            frontier = cls()
+            start = time.perf_counter()
+            for i in range(size):
+                frontier.add(util.Node(i, None, None))
+            added = time.perf_counter()
+            for state in probes:
+                frontier.contains_state(state)
+            probed = time.perf_counter()
+            while not frontier.isempty():
+                frontier.remove()
+            drained = time.perf_counter()
+            print(f"{name:<22}{size:>9}{added - start:>9.3f}"
+                  f"{probed - added:>12.3f}{drained - probed:>10.3f}")
+
+
+class LegacyNode():
+    """
+    The original search node: a plain instance dict holding the parent
+    state rather than the parent node.
+    """
+
+    def __init__(self, state, parent, action):
+        self.state = state
+        self.parent = parent
+        self.action = action
+
+
+def benchmark_nodes(count):
+    """
+    Prints the bytes per node of `count` chained LegacyNode and
+    util.Node objects, as traced by tracemalloc.
+    """
+    for cls in (LegacyNode, util.Node):
+        states = [str(i) for i in range(count)]
+        tracemalloc.start()
+        parent = None
+        nodes = []
+        for state in states:
+            node = cls(state, parent if cls is util.Node else
+                       getattr(parent, "state", None), "movie")
+            nodes.append(node)
+            parent = node
+        size, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print(f"{cls.__name__:<12}{size / count:>8.1f} bytes/node")
+
+
+def check_path(source, target, path):
+    """
+    Raises AssertionError unless `path` is a valid chain of co-stars
+    leading from source to target, or [] when they are the same.
+    """
+    if source == target and path != []:
+        raise AssertionError(f"{source} -> itself gave {path}, not []")
+    if path is None:
+        return
+    person_id = source
+    for movie_id, next_id in path:
+        stars = degrees.movies[movie_id]["stars"]
+        if person_id not in stars or next_id not in stars:
+            raise AssertionError(f"invalid step {person_id} -> {next_id}")
+        person_id = next_id
+    if person_id != target:
+        raise AssertionError(f"path ends at {person_id}, not {target}")
+
+
+def random_pairs(count, seed=50):
+    """
+    Returns `count` random (source, target) pairs of distinct people.
+    """
+    rng = random.Random(seed)
+    person_ids = sorted(degrees.people)
+    return [tuple(rng.sample(person_ids, 2)) for _ in range(count)]
+
+
+def with_self_pairs(pairs, count=3):
+    """
+    Returns pairs followed by (source, source) for the first `count`
+    sources, which every engine must answer with [].
+    """
+    return pairs + [(source, source) for source, _ in pairs[:count]]
+
+
+class dataset():
+    """
+    Context manager yielding a data directory, generating a synthetic
+    one for "synthetic:PEOPLE".
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.tmp = None
+
+    def __enter__(self):
+        if not self.directory.startswith("synthetic:"):
+            return self.directory
+        self.tmp = tempfile.TemporaryDirectory()
+        write_synthetic(self.tmp.name, int(self.directory.split(":")[1]))
+        return self.tmp.name
+
+    def __exit__(self, *exc):
+        if self.tmp is not None:
+            self.tmp.cleanup()
+
+
+def synthetic_name(rng):
+    """
+    Returns a random two-part name built from syllables.
+    """
+    return " ".join(
+        "".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 3)))
+        .capitalize() for _ in range(2))
+
+
+SYLLABLES = [onset + vowel + coda
+             for onset in ["", "b", "br", "c", "ch", "d", "f", "g", "h",
+                           "j", "k", "l", "m", "n", "p", "r", "s", "st",
+                           "t", "v", "w"]
+             for vowel in ["a", "e", "i", "o", "u", "ee", "ai"]
+             for coda in ["", "n", "r", "l", "s"]]
+
+
+def write_synthetic(directory, n_people, cast_size=6, seed=50):
+    """
+    Writes people.csv, movies.csv and stars.csv for a random graph in
+    which each movie casts `cast_size` people, most of them popular.
+    """
+    rng = random.Random(seed)
+    n_movies = n_people // 2
+    with open(os.path.join(directory, "people.csv"), "w",
+              newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["id", "name", "birth"])
+        for i in range(n_people):
+            writer.writerow([i, synthetic_name(rng), 1900 + i % 100])
+    with open(os.path.join(directory, "movies.csv"), "w",
+              newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["id", "title", "year"])
+        for i in range(n_movies):
+            writer.writerow([i, f"Movie {i}", 1950 + i % 70])
+    with open(os.path.join(directory, "stars.csv"), "w",
+              newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["person_id", "movie_id"])
+        for movie_id in range(n_movies):
+            cast = {int(n_people * rng.random() ** 2)
+                    for _ in range(cast_size)}
+            for person_id in cast:
+                writer.writerow([person_id, movie_id])
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,22 @@
+import argparse
 import csv
+import json
 import sys
+import threading
+import time
 
-from util import Node, StackFrontier, QueueFrontier
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+import events
+import paths
+import server
+from graph import CompactGraph
+from nameindex import NameIndex
+from parallel import ParallelSearch
+from util import Node, HashedQueueFrontier, SourceTree, TreeCache
 
 # Maps names to a set of corresponding person_ids
 names = {}
@@ -12,15 +27,71 @@ people = {}
 # Maps movie_ids to a dictionary of: title, year, stars (a set of person_ids)
 movies = {}
 
+# CompactGraph holding the data when loaded with compact=True; people and
+# movies are then read-only views over it
+graph = None
+
+# TreeCache of per-source shortest path trees, when enabled
+tree_cache = None
+
+# NameIndex for prefix and fuzzy lookups, built by get_name_index
+name_index = None
+_name_index_lock = threading.Lock()
+
+# Lowest score, and lead over the runner-up, at which a fuzzy query
+# resolves a name on its own
+FUZZY_ACCEPT = 0.6
+FUZZY_MARGIN = 0.05
 
-def load_data(directory):
+# ParallelSearch process pool used by the "parallel" engine, when enabled
+parallel_search = None
+
+# Filled in by load_data: where the data came from, how long it took, the
+# CSV rows parsed and the process's peak resident memory so far
+load_stats = {"source": None, "seconds": 0.0, "rows": 0, "peak_rss_mib": None}
+
+
+def load_data(directory, compact=False, snapshot=True):
     """
     Load data from CSV files into memory.
+
+    With `compact`, the data is held in an integer-indexed CompactGraph
+    and searches run on its CSR arrays instead of the dictionaries.
+    The compact graph is also cached in a binary snapshot beside the
+    CSVs unless `snapshot` is false, and reused while the CSVs are
+    unchanged.
     """
+    global graph, people, movies, name_index, parallel_search
+    start = time.perf_counter()
+    names.clear()
+    name_index = None
+    # Cached trees and the worker pool belong to the previous data
+    if tree_cache is not None:
+        tree_cache.clear()
+    if parallel_search is not None:
+        parallel_search.close()
+        parallel_search = None
+    if compact:
+        graph, load_stats["source"] = CompactGraph.from_directory(
+            directory, snapshot=snapshot)
+        with events.phase("load.names"):
+            names.update(graph.names())
+        people = graph.people_view()
+        movies = graph.movies_view()
+        _finish_load(start, graph.rows)
+        return
+    graph = None
+    people = {}
+    movies = {}
+
+    rows = 0
+
     # Load people
-    with open(f"{directory}/people.csv", encoding="utf-8") as f:
+    with open(f"{directory}/people.csv", encoding="utf-8") as f, \
+            events.phase("load.people") as counters:
         reader = csv.DictReader(f)
         for row in reader:
+            rows += 1
             people[row["id"]] = {
                 "name": row["name"],
                 "birth": row["birth"],
@@ -30,38 +101,157 @@ def load_data(directory):
                 names[row["name"].lower()] = {row["id"]}
             else:
                 names[row["name"].lower()].add(row["id"])
+        counters["rows"] = len(people)
 
     # Load movies
-    with open(f"{directory}/movies.csv", encoding="utf-8") as f:
+    with open(f"{directory}/movies.csv", encoding="utf-8") as f, \
+            events.phase("load.movies") as counters:
         reader = csv.DictReader(f)
         for row in reader:
+            rows += 1
             movies[row["id"]] = {
                 "title": row["title"],
                 "year": row["year"],
                 "stars": set()
             }
+        counters["rows"] = len(movies)
 
     # Load stars
-    with open(f"{directory}/stars.csv", encoding="utf-8") as f:
+    with open(f"{directory}/stars.csv", encoding="utf-8") as f, \
+            events.phase("load.stars") as counters:
         reader = csv.DictReader(f)
         for row in reader:
+            rows += 1
             try:
                 people[row["person_id"]]["movies"].add(row["movie_id"])
                 movies[row["movie_id"]]["stars"].add(row["person_id"])
             except KeyError:
                 pass
+        counters["rows"] = rows - len(people) - len(movies)
+    load_stats["source"] = "csv"
+    _finish_load(start, rows)
+
+
+def _finish_load(start, rows):
+    load_stats["seconds"] = time.perf_counter() - start
+    load_stats["rows"] = rows
+    if resource is not None:
+        # ru_maxrss is in bytes on macOS and KiB elsewhere
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        scale = 2 ** 20 if sys.platform == "darwin" else 2 ** 10
+        load_stats["peak_rss_mib"] = peak / scale
+    events.emit("load", **load_stats)
 
 
 def main():
-    if len(sys.argv) > 2:
-        sys.exit("Usage: python degrees.py [directory]")
-    directory = sys.argv[1] if len(sys.argv) == 2 else "large"
+    parser = argparse.ArgumentParser(
+        description="Find degrees of separation between two people.")
+    parser.add_argument("directory", nargs="?", default="large")
+    parser.add_argument("--compact", action="store_true",
+                        help="load into the integer-indexed CSR graph")
+    parser.add_argument("--no-snapshot", dest="snapshot",
+                        action="store_false",
+                        help="do not read or write the compact snapshot")
+    parser.add_argument("--engine", choices=ENGINES, default="bidirectional",
+                        help="search engine (default: bidirectional)")
+    parser.add_argument("--batch", metavar="FILE",
+                        help="answer source,target lines from FILE "
+                             "('-' for stdin) as JSON lines")
+    parser.add_argument("--serve", metavar="ADDRESS",
+                        help="serve queries on unix:PATH or http:PORT")
+    parser.add_argument("--fuzzy", action="store_true",
+                        help="resolve unknown names to their best prefix "
+                             "or fuzzy match in batch and server modes")
+    parser.add_argument("--events", metavar="FILE",
+                        help="append timing and counter events to FILE "
+                             "as JSON lines")
+    parser.add_argument("--workers", type=int, default=4,
+                        help="query worker threads (default: 4)")
+    parser.add_argument("--processes", type=int, default=4,
+                        help="processes for the parallel engine (default: 4)")
+    parser.add_argument("--tree-cache-mb", type=float, default=0,
+                        help="cache single-source trees of repeated "
+                             "sources in up to this many MiB")
+    parser.add_argument("--admit-after", type=int, default=2,
+                        help="queries from a source before its tree is "
+                             "cached (default: 2)")
+    args = parser.parse_args()
+    if args.engine == "parallel" and not args.compact:
+        parser.error("--engine parallel requires --compact")
+    if args.tree_cache_mb:
+        enable_tree_cache(int(args.tree_cache_mb * 2 ** 20),
+                          admit_after=args.admit_after)
+
+    if args.events:
+        events.subscribe(_event_writer(args.events))
+
+    # Load data from files into memory; batch output owns stdout
+    log = sys.stderr if args.batch or args.serve else sys.stdout
+    print("Loading data...", file=log)
+    load_data(args.directory, compact=args.compact, snapshot=args.snapshot)
+    print(f"Data loaded from {load_stats['source']} "
+          f"in {load_stats['seconds']:.2f}s.", file=log)
+    if load_stats["rows"]:
+        rate = load_stats["rows"] / max(load_stats["seconds"], 1e-9)
+        print(f"{load_stats['rows']} rows at {rate:.0f} rows/s", end="",
+              file=log)
+        if load_stats["peak_rss_mib"] is not None:
+            print(f", peak RSS {load_stats['peak_rss_mib']:.1f} MiB", end="",
+                  file=log)
+        print(".", file=log)
+
+    if args.engine == "parallel":
+        enable_parallel(args.processes)
+    try:
+        if args.batch or args.serve:
+            run_queries(args)
+        else:
+            ask(args.engine)
+    finally:
+        if parallel_search is not None:
+            parallel_search.close()
 
-    # Load data from files into memory
-    print("Loading data...")
-    load_data(directory)
-    print("Data loaded.")
 
+def _event_writer(path):
+    """
+    Returns an event callback appending JSON lines to the file at path.
+    """
+    f = open(path, "a", encoding="utf-8")
+    lock = threading.Lock()
+
+    def write(event):
+        line = json.dumps(event, default=str) + "\n"
+        with lock:
+            f.write(line)
+            f.flush()
+    return write
+
+
+def run_queries(args):
+    """
+    Answers queries from --batch input or a --serve socket.
+    """
+    def answer(source_name, target_name):
+        return query(source_name, target_name, engine=args.engine,
+                     fuzzy=args.fuzzy)
+
+    if args.serve:
+        server.serve(args.serve, answer, workers=args.workers)
+    elif args.batch == "-":
+        server.report(server.run_batch(
+            sys.stdin, sys.stdout, answer, workers=args.workers))
+    else:
+        with open(args.batch, encoding="utf-8", newline="") as f:
+            server.report(server.run_batch(
+                f, sys.stdout, answer, workers=args.workers))
+    if tree_cache is not None:
+        print(f"Tree cache: {tree_cache.stats()}", file=sys.stderr)
+
+
+def ask(engine):
+    """
+    Prompts for two names and prints the degrees of separation.
+    """
     source = person_id_for_name(input("Name: "))
     if source is None:
         sys.exit("Person not found.")
@@ -69,7 +259,7 @@ def main():
     if target is None:
         sys.exit("Person not found.")
 
-    path = shortest_path(source, target)
+    path = shortest_path(source, target, engine=engine)
 
     if path is None:
         print("Not connected.")
@@ -84,39 +274,383 @@ def main():
             print(f"{i + 1}: {person1} and {person2} starred in {movie}")
 
 
-def shortest_path(source, target):
+def shortest_path(source, target, engine="bidirectional"):
     """
     Returns the shortest list of (movie_id, person_id) pairs
     that connect the source to the target.
 
-    If no possible path, returns None.
+    If no possible path, returns None; if source is target, every
+    engine returns [].
+
+    `engine` selects the search strategy from ENGINES; the number of
+    nodes it expanded is left in `search_stats`. With a tree cache
+    enabled, sources asked for often enough get a cached single-source
+    tree and later queries from them are a predecessor walk.
+    """
+    try:
+        search = ENGINES[engine]
+    except KeyError:
+        raise ValueError(f"unknown engine {engine!r}")
+    if graph is not None:
+        index = graph.person_index
+        source, target = index[source], index[target]
+
+    if tree_cache is not None:
+        tree = tree_cache.get(source)
+        # Compact trees all have the same size, known before building
+        if (tree is None and tree_cache.should_admit(source)
+                and (graph is None or tree_cache.fits(graph.tree_nbytes))):
+            with events.phase("tree", source=str(source)):
+                tree = single_source(source)
+            tree_cache.put(tree)
+        if tree is not None:
+            stats = _start_search("tree")
+            path = _finish_search(stats, tree.path(target))
+            return graph.external_path(path) if graph is not None else path
+
+    if graph is not None:
+        return graph.external_path(search(source, target, graph.neighbors))
+    return search(source, target, _neighbors)
+
+
+def all_shortest_paths(source, target, max_depth=None):
+    """
+    Yields every shortest list of (movie_id, person_id) pairs from
+    source to target, lazily; nothing if they are not connected within
+    `max_depth` degrees.
+    """
+    yield from _external(paths.all_shortest_paths, source, target, max_depth)
+
+
+def paths_within(source, target, max_depth):
+    """
+    Yields every list of (movie_id, person_id) pairs connecting source
+    to target in at most `max_depth` degrees with no person repeated.
+    """
+    yield from _external(paths.paths_within, source, target, max_depth)
+
+
+def _external(engine, source, target, max_depth):
+    """
+    Runs a path enumeration engine on the loaded layout, yielding paths
+    of external ids.
+    """
+    if graph is None:
+        yield from engine(source, target, _neighbors, max_depth)
+        return
+    index = graph.person_index
+    for path in engine(index[source], index[target], graph.neighbors,
+                       max_depth):
+        yield graph.external_path(path)
+
+
+def enable_tree_cache(max_bytes, admit_after=2):
+    """
+    Caches single-source trees for sources asked for at least
+    `admit_after` times, keeping at most `max_bytes` of trees.
+    """
+    global tree_cache
+    tree_cache = TreeCache(max_bytes, admit_after=admit_after)
+
+
+def single_source(source):
+    """
+    Returns the SourceTree of shortest paths from source to every
+    reachable person, in one breadth-first pass. In compact mode the
+    tree's states are person indices of `graph`.
+    """
+    if graph is not None:
+        return graph.bfs_tree(source)
+    distance = {source: 0}
+    parent = {source: None}
+    action = {source: None}
+    movie_seen = set()
+    level = [source]
+    while level:
+        next_level = []
+        for person_id in level:
+            depth = distance[person_id] + 1
+            for movie_id in people[person_id]["movies"]:
+                # Every star of a movie is reached the first time it is seen
+                if movie_id in movie_seen:
+                    continue
+                movie_seen.add(movie_id)
+                for neighbor in movies[movie_id]["stars"]:
+                    if neighbor not in distance:
+                        distance[neighbor] = depth
+                        parent[neighbor] = person_id
+                        action[neighbor] = movie_id
+                        next_level.append(neighbor)
+        level = next_level
+    return SourceTree(source, distance, parent, action)
+
+
+def _neighbors(person_id):
+    """
+    Yields (movie_id, person_id) pairs for everyone who starred with
+    `person_id`, including `person_id` itself.
+    """
+    for movie_id in people[person_id]["movies"]:
+        for star_id in movies[movie_id]["stars"]:
+            yield movie_id, star_id
+
+
+def shortest_path_bfs(source, target, neighbors):
+    """
+    Reference engine: one-sided breadth-first search from source.
+
+    Engines take the source and target states and a `neighbors`
+    function yielding (action, state) pairs for a state.
     """
+    stats = _start_search("bfs")
+    if source == target:
+        return _finish_search(stats, [])
 
-    # TODO
-    #frontiers_=StackFrontier() # depth-first search
-    frontiers_=QueueFrontier() # breadth-first search
-    exploredSet_=StackFrontier()
+    #frontiers_=HashedStackFrontier() # depth-first search
+    frontiers_=HashedQueueFrontier() # breadth-first search
+    exploredSet_=set()
     frontiers_.add(Node(source,None,None))
     while not frontiers_.isempty():
+        stats["frontier_peak"] = max(stats["frontier_peak"], len(frontiers_))
         Node_=frontiers_.remove()
-        exploredSet_.add(Node_)
-        for m in people[Node_.state]['movies']:
-            for p in movies[m]['stars']:
-                if exploredSet_.contains_state(p) or frontiers_.contains_state(p):
+        exploredSet_.add(Node_.state)
+        stats["expanded"] += 1
+        for m, p in neighbors(Node_.state):
+            if p in exploredSet_ or frontiers_.contains_state(p):
+                stats["duplicates"] += 1
+                continue
+            elif p==target:
+                with events.phase("path") as counters:
+                    path = Node(p,Node_,m).path()
+                    counters["length"] = len(path)
+                return _finish_search(stats, path)
+            else:
+                frontiers_.add(Node(p,Node_,m))
+    return _finish_search(stats, None)
+    #raise NotImplementedError
+
+
+def shortest_path_bidirectional(source, target, neighbors):
+    """
+    Breadth-first search grown from both source and target,
+    one whole level at a time from whichever side has the smaller
+    frontier, until the two searches meet in the middle.
+    """
+    stats = _start_search("bidirectional")
+    if source == target:
+        return _finish_search(stats, [])
+
+    # Each side maps a reached person to (parent person, movie, depth)
+    forward = {source: (None, None, 0)}
+    backward = {target: (None, None, 0)}
+    forward_level = [source]
+    backward_level = [target]
+
+    while forward_level and backward_level:
+        if len(forward_level) <= len(backward_level):
+            level, seen, other = forward_level, forward, backward
+        else:
+            level, seen, other = backward_level, backward, forward
+        stats["frontier_peak"] = max(stats["frontier_peak"], len(level))
+
+        # Expand the whole level so the best meeting point is found
+        best = None
+        next_level = []
+        for person_id in level:
+            stats["expanded"] += 1
+            depth = seen[person_id][2] + 1
+            for movie_id, neighbor in neighbors(person_id):
+                if neighbor in seen:
+                    stats["duplicates"] += 1
                     continue
-                elif p==target:
-                    temp_=[(m,p)]
-                    par=Node_.state
-                    while not exploredSet_.isempty():
-                        n_= exploredSet_.remove()
-                        if n_.state==par:
-                            temp_.append((n_.action,n_.state))
-                            par=n_.parent
-                    return temp_[-2::-1]
+                seen[neighbor] = (person_id, movie_id, depth)
+                if neighbor in other:
+                    length = depth + other[neighbor][2]
+                    if best is None or length < best[0]:
+                        best = (length, neighbor)
                 else:
-                    frontiers_.add(Node(p,Node_.state,m))
-    return None
-    #raise NotImplementedError
+                    next_level.append(neighbor)
+        if best is not None:
+            with events.phase("path") as counters:
+                path = _join_paths(forward, backward, best[1])
+                counters["length"] = len(path)
+            return _finish_search(stats, path)
+
+        if seen is forward:
+            forward_level = next_level
+        else:
+            backward_level = next_level
+    return _finish_search(stats, None)
+
+
+def shortest_path_parallel(source, target, neighbors):
+    """
+    Level-synchronous BFS with each level split across the process
+    pool started by enable_parallel; needs the compact graph.
+    """
+    if parallel_search is None:
+        raise ValueError("the parallel engine needs load_data(compact=True) "
+                         "and enable_parallel()")
+    stats = _start_search("parallel")
+    path = parallel_search.shortest_path(source, target)
+    stats["expanded"] = parallel_search.stats["expanded"]
+    stats["levels"] = parallel_search.stats["levels"]
+    stats["parallel_levels"] = parallel_search.stats["parallel_levels"]
+    return _finish_search(stats, path)
+
+
+def _start_search(engine):
+    """
+    Returns the counters an engine updates while it searches.
+    """
+    return {"engine": engine, "expanded": 0, "frontier_peak": 0,
+            "duplicates": 0, "start": time.perf_counter()}
+
+
+def _finish_search(stats, path):
+    """
+    Publishes an engine's counters to search_stats and as a "search"
+    event, then returns path.
+    """
+    stats["seconds"] = time.perf_counter() - stats.pop("start")
+    stats["found"] = path is not None
+    search_stats.clear()
+    search_stats.update(stats)
+    events.emit("search", **stats)
+    return path
+
+
+def enable_parallel(workers):
+    """
+    Starts a pool of `workers` processes sharing the compact graph, for
+    the "parallel" engine. Returns the ParallelSearch; close it when done.
+    """
+    global parallel_search
+    if graph is None:
+        raise ValueError("parallel search needs load_data(compact=True)")
+    parallel_search = ParallelSearch(graph, workers)
+    return parallel_search
+
+
+def _join_paths(forward, backward, meeting):
+    """
+    Returns the (movie_id, person_id) path through `meeting`, using the
+    parent maps of a bidirectional search.
+    """
+    path = []
+    person_id = meeting
+    while forward[person_id][0] is not None:
+        parent, movie_id, _ = forward[person_id]
+        path.append((movie_id, person_id))
+        person_id = parent
+    path.reverse()
+
+    person_id = meeting
+    while backward[person_id][0] is not None:
+        parent, movie_id, _ = backward[person_id]
+        path.append((movie_id, parent))
+        person_id = parent
+    return path
+
+
+# Search engines selectable through shortest_path
+ENGINES = {
+    "bfs": shortest_path_bfs,
+    "bidirectional": shortest_path_bidirectional,
+    "parallel": shortest_path_parallel,
+}
+
+# Counters of the last search run: engine name, nodes expanded, largest
+# frontier level, neighbors skipped as already seen, seconds taken and
+# whether a path was found; each search also emits them as an event
+search_stats = {"engine": None, "expanded": 0}
+
+
+def query(source_name, target_name, engine="bidirectional", fuzzy=False):
+    """
+    Answers one query by name without prompting, returning a dict with
+    the degrees and path, or an "error" naming the unresolved person
+    with ranked candidates.
+
+    With `fuzzy`, a name with no exact match resolves to the best
+    prefix or fuzzy match when that match is a single person; the
+    names used are reported under "resolved".
+    """
+    with events.tagged(source=source_name, target=target_name), \
+            events.phase("query"):
+        return _query(source_name, target_name, engine, fuzzy)
+
+
+def _query(source_name, target_name, engine, fuzzy):
+    result = {"source": source_name, "target": target_name}
+    ids = []
+    for role, name in (("source", source_name), ("target", target_name)):
+        person_ids = person_ids_for_name(name)
+        if len(person_ids) > 1:
+            result["error"] = f"{role} is ambiguous"
+            result["candidates"] = [
+                _candidate(1.0, person_id) for person_id in person_ids]
+            return result
+        if not person_ids:
+            matches = get_name_index().search(name)
+            if fuzzy and _decisive(matches):
+                person_ids = [matches[0][1]]
+                result.setdefault("resolved", {})[role] = (
+                    people[matches[0][1]]["name"])
+            else:
+                result["error"] = f"{role} not found"
+                result["candidates"] = [
+                    _candidate(score, person_id)
+                    for score, person_id, _ in matches]
+                return result
+        ids.append(person_ids[0])
+
+    path = shortest_path(ids[0], ids[1], engine=engine)
+    if path is None:
+        result["degrees"] = None
+        result["path"] = None
+        return result
+    result["degrees"] = len(path)
+    result["path"] = [
+        {"movie_id": movie_id, "movie": movies[movie_id]["title"],
+         "person_id": person_id, "person": people[person_id]["name"]}
+        for movie_id, person_id in path
+    ]
+    return result
+
+
+def _decisive(matches):
+    """
+    Returns True if the best of the ranked matches scores at least
+    FUZZY_ACCEPT and leads the runner-up by FUZZY_MARGIN.
+    """
+    if not matches or matches[0][0] < FUZZY_ACCEPT:
+        return False
+    return len(matches) == 1 or matches[0][0] - matches[1][0] >= FUZZY_MARGIN
+
+
+def _candidate(score, person_id):
+    person = people[person_id]
+    return {"person_id": person_id, "name": person["name"],
+            "birth": person["birth"], "score": round(score, 3)}
+
+
+def get_name_index():
+    """
+    Returns the NameIndex over `names`, building it on first use.
+    """
+    global name_index
+    with _name_index_lock:
+        if name_index is None:
+            name_index = NameIndex(names)
+        return name_index
+
+
+def person_ids_for_name(name):
+    """
+    Returns the sorted IMDB ids for a person's name, without prompting.
+    """
+    return sorted(names.get(name.lower(), ()))
 
 
 def person_id_for_name(name):
@@ -150,6 +684,9 @@ def neighbors_for_person(person_id):
     Returns (movie_id, person_id) pairs for people
     who starred with a given person.
     """
+    if graph is not None:
+        return set(graph.external_path(
+            graph.neighbors(graph.person_index[person_id])))
     movie_ids = people[person_id]["movies"]
     neighbors = set()
     for movie_id in movie_ids:
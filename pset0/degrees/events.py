@@ -0,0 +1,98 @@
+"""
+Structured timing and counter events for degrees.
+
+Code emits events as dicts with an "event" name; callbacks registered
+with subscribe (or the recording context manager) receive them. With
+no subscribers, emit and phase cost next to nothing.
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+
+_listeners = []
+_local = threading.local()
+
+
+def subscribe(callback):
+    """
+    Calls callback(event) for every event emitted from now on.
+    """
+    _listeners.append(callback)
+
+
+def unsubscribe(callback):
+    _listeners.remove(callback)
+
+
+def enabled():
+    return bool(_listeners)
+
+
+def emit(event, **fields):
+    """
+    Sends {"event": event, **tags, **fields} to every subscriber, where
+    tags are those set by `tagged` in the current thread.
+    """
+    if not _listeners:
+        return
+    record = {"event": event, "time": time.time()}
+    record.update(getattr(_local, "tags", {}))
+    record.update(fields)
+    for callback in list(_listeners):
+        callback(record)
+
+
+@contextmanager
+def tagged(**tags):
+    """
+    Adds `tags` to every event emitted by this thread inside the block.
+    """
+    previous = getattr(_local, "tags", {})
+    _local.tags = {**previous, **tags}
+    try:
+        yield
+    finally:
+        _local.tags = previous
+
+
+@contextmanager
+def phase(name, **fields):
+    """
+    Emits a "phase" event with the seconds spent inside the block. The
+    block may add counters to the yielded dict; a block left by an
+    exception is marked with its "error" type.
+    """
+    counters = dict(fields)
+    start = time.perf_counter()
+    try:
+        yield counters
+    except BaseException as e:
+        counters["error"] = type(e).__name__
+        raise
+    finally:
+        if _listeners:
+            emit("phase", name=name,
+                 seconds=time.perf_counter() - start, **counters)
+
+
+@contextmanager
+def recording(callback=None):
+    """
+    Subscribes for the duration of the block and yields the list of
+    events received; they are also passed to `callback`, if given.
+    """
+    received = []
+    lock = threading.Lock()
+
+    def record(event):
+        with lock:
+            received.append(event)
+        if callback is not None:
+            callback(event)
+
+    subscribe(record)
+    try:
+        yield received
+    finally:
+        unsubscribe(record)
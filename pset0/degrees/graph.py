@@ -0,0 +1,458 @@
+"""
+Compact integer-indexed representation of the degrees dataset.
+
+People and movies are interned to dense integers and the bipartite
+person <-> movie relation is stored twice in CSR form: an offsets
+array per side, and an index array holding the neighbors of entry `i`
+at positions offsets[i]:offsets[i + 1].
+"""
+
+import csv
+import json
+import mmap
+import os
+import struct
+from array import array
+from collections.abc import Mapping
+from operator import itemgetter
+
+import events
+from util import SourceTree
+
+# Typecodes for the CSR arrays: 64-bit offsets, 32-bit indices
+OFFSET = "q"
+INDEX = "i"
+
+# Read size of the streaming CSV parser
+CHUNK_SIZE = 1 << 20
+
+# Snapshot file: magic, format version, header length, JSON header, then
+# 8-byte aligned sections for the string tables and CSR arrays
+SNAPSHOT_NAME = "degrees.snapshot"
+SNAPSHOT_MAGIC = b"DEGSNAP\0"
+SNAPSHOT_VERSION = 2
+SNAPSHOT_PREFIX = struct.Struct("<8sII")
+SOURCE_FILES = ("people.csv", "movies.csv", "stars.csv")
+
+# Attributes saved in a snapshot
+STRING_TABLES = ("person_ids", "person_names", "person_births",
+                 "movie_ids", "movie_titles", "movie_years")
+ARRAYS = ("person_offsets", "person_movies", "movie_offsets", "movie_stars")
+
+
+class CompactGraph():
+
+    def __init__(self):
+        # Index -> external id, and external id -> index
+        self.person_ids = []
+        self.person_index = {}
+        self.movie_ids = []
+        self.movie_index = {}
+
+        # Index -> display fields
+        self.person_names = []
+        self.person_births = []
+        self.movie_titles = []
+        self.movie_years = []
+
+        # CSR adjacency: person -> movies and movie -> stars
+        self.person_offsets = array(OFFSET, [0])
+        self.person_movies = array(INDEX)
+        self.movie_offsets = array(OFFSET, [0])
+        self.movie_stars = array(INDEX)
+
+        # CSV rows parsed to build the graph (0 when loaded from a snapshot)
+        self.rows = 0
+
+    @classmethod
+    def from_csv(cls, directory):
+        """
+        Builds a graph from people.csv, movies.csv and stars.csv,
+        streaming only the needed columns straight into the id tables
+        and edge arrays. The number of rows read is left in `rows`.
+        """
+        graph = cls()
+        rows = 0
+        # Births and years repeat heavily; keep one string per value
+        shared = {}
+
+        person_index = graph.person_index
+        with events.phase("load.people") as counters:
+            for person_id, name, birth in read_columns(
+                    f"{directory}/people.csv", "id", "name", "birth"):
+                person_index[person_id] = len(graph.person_ids)
+                graph.person_ids.append(person_id)
+                graph.person_names.append(name)
+                graph.person_births.append(shared.setdefault(birth, birth))
+            counters["rows"] = len(graph.person_ids)
+        rows += len(graph.person_ids)
+
+        movie_index = graph.movie_index
+        with events.phase("load.movies") as counters:
+            for movie_id, title, year in read_columns(
+                    f"{directory}/movies.csv", "id", "title", "year"):
+                movie_index[movie_id] = len(graph.movie_ids)
+                graph.movie_ids.append(movie_id)
+                graph.movie_titles.append(title)
+                graph.movie_years.append(shared.setdefault(year, year))
+            counters["rows"] = len(graph.movie_ids)
+        rows += len(graph.movie_ids)
+
+        # Edge list first, then counting sort into both CSR directions
+        edge_people = array(INDEX)
+        edge_movies = array(INDEX)
+        # Repeated rows would be repeated edges; the dict layout keeps
+        # stars in sets, so drop them here too
+        seen = set()
+        n_movies = len(graph.movie_ids)
+        with events.phase("load.stars") as counters:
+            for person_id, movie_id in read_columns(
+                    f"{directory}/stars.csv", "person_id", "movie_id"):
+                rows += 1
+                person = person_index.get(person_id)
+                movie = movie_index.get(movie_id)
+                if person is None or movie is None:
+                    continue
+                edge = person * n_movies + movie
+                if edge in seen:
+                    continue
+                seen.add(edge)
+                edge_people.append(person)
+                edge_movies.append(movie)
+            counters["rows"] = rows - len(graph.person_ids) - len(
+                graph.movie_ids)
+            counters["edges"] = len(edge_people)
+        with events.phase("load.adjacency"):
+            graph.build_adjacency(edge_people, edge_movies)
+        graph.rows = rows
+        return graph
+
+    @classmethod
+    def from_directory(cls, directory, snapshot=True):
+        """
+        Returns (graph, source): the graph loaded from the snapshot in
+        `directory` if it is current ("snapshot"), otherwise built from
+        the CSVs ("csv") and, with `snapshot`, saved for later runs.
+        """
+        path = os.path.join(directory, SNAPSHOT_NAME)
+        key = snapshot_key(directory)
+        if snapshot:
+            try:
+                with events.phase("load.snapshot"):
+                    return cls.load(path, key), "snapshot"
+            except (OSError, ValueError) as e:
+                events.emit("snapshot.miss", reason=str(e))
+        graph = cls.from_csv(directory)
+        if snapshot:
+            try:
+                with events.phase("snapshot.save"):
+                    graph.save(path, key)
+            except OSError:
+                pass
+        return graph, "csv"
+
+    def save(self, path, key):
+        """
+        Writes the graph to a snapshot file at `path`, tagged with `key`.
+        """
+        sections = []
+        for name in STRING_TABLES:
+            values = getattr(self, name)
+            blob = "\0".join(values).encode("utf-8")
+            sections.append((name, "s", len(values), blob))
+        for name in ARRAYS:
+            values = getattr(self, name)
+            kind = getattr(values, "typecode", None) or values.format
+            sections.append((name, kind, len(values), bytes(values)))
+
+        header = {"key": key, "sections": []}
+        offset = 0
+        for name, kind, count, blob in sections:
+            header["sections"].append([name, kind, count, offset, len(blob)])
+            offset += _padded(len(blob))
+        encoded = json.dumps(header).encode("utf-8")
+        start = _padded(SNAPSHOT_PREFIX.size + len(encoded))
+
+        # Write beside the target and rename, so readers never see a
+        # partial file and existing mappings stay valid
+        tmp = f"{path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp, "wb") as f:
+                f.write(SNAPSHOT_PREFIX.pack(
+                    SNAPSHOT_MAGIC, SNAPSHOT_VERSION, len(encoded)))
+                f.write(encoded)
+                f.write(bytes(start - f.tell()))
+                for *_, blob in sections:
+                    f.write(blob)
+                    f.write(bytes(_padded(len(blob)) - len(blob)))
+            os.replace(tmp, path)
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+
+    @classmethod
+    def load(cls, path, key=None):
+        """
+        Loads a snapshot written by save. The CSR arrays are memoryviews
+        over a read-only memory map, so they are not copied.
+
+        Raises ValueError if the file is not a snapshot of this version,
+        or its key does not match `key`.
+        """
+        with open(path, "rb") as f:
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            magic, version, length = SNAPSHOT_PREFIX.unpack_from(data)
+        except struct.error:
+            raise ValueError("truncated snapshot")
+        if magic != SNAPSHOT_MAGIC or version != SNAPSHOT_VERSION:
+            raise ValueError("not a current degrees snapshot")
+        header = json.loads(
+            data[SNAPSHOT_PREFIX.size:SNAPSHOT_PREFIX.size + length])
+        if key is not None and header["key"] != key:
+            raise ValueError("stale snapshot")
+        start = _padded(SNAPSHOT_PREFIX.size + length)
+        if start + sum(_padded(size) for *_, size in header["sections"]) \
+                > len(data):
+            raise ValueError("truncated snapshot")
+
+        graph = cls()
+        view = memoryview(data)
+        for name, kind, count, offset, size in header["sections"]:
+            section = view[start + offset:start + offset + size]
+            if kind == "s":
+                values = str(section, "utf-8").split("\0") if count else []
+                setattr(graph, name, values)
+            else:
+                setattr(graph, name, section.cast(kind))
+        graph.person_index = {
+            person_id: i for i, person_id in enumerate(graph.person_ids)}
+        graph.movie_index = {
+            movie_id: i for i, movie_id in enumerate(graph.movie_ids)}
+        return graph
+
+    def build_adjacency(self, edge_people, edge_movies):
+        """
+        Fills both CSR directions from parallel arrays of edge endpoints.
+        """
+        self.person_offsets, self.person_movies = _csr(
+            len(self.person_ids), edge_people, edge_movies)
+        self.movie_offsets, self.movie_stars = _csr(
+            len(self.movie_ids), edge_movies, edge_people)
+
+    def __len__(self):
+        return len(self.person_ids)
+
+    def movies_of(self, person):
+        """
+        Returns the movie indices of person index `person`.
+        """
+        offsets = self.person_offsets
+        return self.person_movies[offsets[person]:offsets[person + 1]]
+
+    def stars_of(self, movie):
+        """
+        Returns the person indices starring in movie index `movie`.
+        """
+        offsets = self.movie_offsets
+        return self.movie_stars[offsets[movie]:offsets[movie + 1]]
+
+    def neighbors(self, person):
+        """
+        Yields (movie, person) index pairs for everyone who starred
+        with person index `person`, including `person` itself.
+        """
+        person_movies = self.person_movies
+        movie_offsets = self.movie_offsets
+        movie_stars = self.movie_stars
+        for i in range(self.person_offsets[person],
+                       self.person_offsets[person + 1]):
+            movie = person_movies[i]
+            for j in range(movie_offsets[movie], movie_offsets[movie + 1]):
+                yield movie, movie_stars[j]
+
+    @property
+    def tree_nbytes(self):
+        """
+        Bytes held by the mappings of any tree bfs_tree returns.
+        """
+        return 3 * array(INDEX).itemsize * len(self.person_ids)
+
+    def bfs_tree(self, source):
+        """
+        Returns the SourceTree of person index `source` over the whole
+        graph, as arrays indexed by person. Each movie is scanned once,
+        the first time any of its stars is expanded.
+        """
+        n = len(self.person_ids)
+        distance = array(INDEX, [-1]) * n
+        parent = array(INDEX, [-1]) * n
+        action = array(INDEX, [-1]) * n
+        movie_seen = bytearray(len(self.movie_ids))
+        person_offsets = self.person_offsets
+        person_movies = self.person_movies
+        movie_offsets = self.movie_offsets
+        movie_stars = self.movie_stars
+
+        distance[source] = 0
+        level = [source]
+        depth = 0
+        while level:
+            depth += 1
+            next_level = []
+            for person in level:
+                for i in range(person_offsets[person],
+                               person_offsets[person + 1]):
+                    movie = person_movies[i]
+                    if movie_seen[movie]:
+                        continue
+                    movie_seen[movie] = 1
+                    for j in range(movie_offsets[movie],
+                                   movie_offsets[movie + 1]):
+                        star = movie_stars[j]
+                        if distance[star] < 0:
+                            distance[star] = depth
+                            parent[star] = person
+                            action[star] = movie
+                            next_level.append(star)
+            level = next_level
+        return SourceTree(source, distance, parent, action)
+
+    def external_path(self, path):
+        """
+        Converts a path of (movie, person) indices to external ids.
+        """
+        if path is None:
+            return None
+        return [(self.movie_ids[movie], self.person_ids[person])
+                for movie, person in path]
+
+    def names(self):
+        """
+        Returns the degrees `names` map: lowercase name -> ids, with the
+        ids held in a tuple rather than a set to save memory.
+        """
+        names = {}
+        for person_id, name in zip(self.person_ids, self.person_names):
+            key = name.lower()
+            names[key] = names.get(key, ()) + (person_id,)
+        return names
+
+    def people_view(self):
+        return PeopleView(self)
+
+    def movies_view(self):
+        return MoviesView(self)
+
+
+class PeopleView(Mapping):
+    """
+    Read-only `people`-shaped mapping over a CompactGraph; records are
+    built on access.
+    """
+
+    def __init__(self, graph):
+        self.graph = graph
+
+    def __getitem__(self, person_id):
+        graph = self.graph
+        person = graph.person_index[person_id]
+        return {
+            "name": graph.person_names[person],
+            "birth": graph.person_births[person],
+            "movies": {graph.movie_ids[m] for m in graph.movies_of(person)},
+        }
+
+    def __iter__(self):
+        return iter(self.graph.person_ids)
+
+    def __len__(self):
+        return len(self.graph.person_ids)
+
+    def __contains__(self, person_id):
+        return person_id in self.graph.person_index
+
+
+class MoviesView(Mapping):
+    """
+    Read-only `movies`-shaped mapping over a CompactGraph.
+    """
+
+    def __init__(self, graph):
+        self.graph = graph
+
+    def __getitem__(self, movie_id):
+        graph = self.graph
+        movie = graph.movie_index[movie_id]
+        return {
+            "title": graph.movie_titles[movie],
+            "year": graph.movie_years[movie],
+            "stars": {graph.person_ids[p] for p in graph.stars_of(movie)},
+        }
+
+    def __iter__(self):
+        return iter(self.graph.movie_ids)
+
+    def __len__(self):
+        return len(self.graph.movie_ids)
+
+    def __contains__(self, movie_id):
+        return movie_id in self.graph.movie_index
+
+
+def read_columns(path, *columns):
+    """
+    Yields tuples of the named columns of the CSV file at `path`,
+    reading it in CHUNK_SIZE blocks and without a dict per row.
+    """
+    with open(path, encoding="utf-8", newline="",
+              buffering=CHUNK_SIZE) as f:
+        reader = csv.reader(f)
+        header = next(reader, [])
+        try:
+            positions = [header.index(column) for column in columns]
+        except ValueError:
+            raise ValueError(f"{path} lacks one of the columns {columns}")
+        pick = itemgetter(*positions)
+        if len(positions) == 1:
+            pick = lambda row, pick=pick: (pick(row),)
+        for row in reader:
+            if row:
+                yield pick(row)
+
+
+def snapshot_key(directory):
+    """
+    Returns the size and modification time of each source CSV, which
+    a snapshot must match to be used.
+    """
+    key = {}
+    for name in SOURCE_FILES:
+        stat = os.stat(os.path.join(directory, name))
+        key[name] = [stat.st_size, stat.st_mtime_ns]
+    return key
+
+
+def _padded(size):
+    """
+    Rounds `size` up to a multiple of 8 bytes.
+    """
+    return (size + 7) & ~7
+
+
+def _csr(n, sources, targets):
+    """
+    Returns (offsets, indices) grouping `targets` by `sources`, where
+    both are parallel arrays of edge endpoints and sources lie in [0, n).
+    """
+    offsets = array(OFFSET, bytes(8 * (n + 1)))
+    for source in sources:
+        offsets[source + 1] += 1
+    for i in range(n):
+        offsets[i + 1] += offsets[i]
+    fill = array(OFFSET, offsets[:n])
+    indices = array(INDEX, bytes(4 * len(targets)))
+    for source, target in zip(sources, targets):
+        indices[fill[source]] = target
+        fill[source] += 1
+    return offsets, indices
@@ -0,0 +1,110 @@
+"""
+Search index over the degrees `names` map.
+
+Lowercase names are kept in a sorted list for prefix queries, and in a
+trigram index for fuzzy queries. Fuzzy candidates are gathered from the
+rarest trigrams of the query only, then ranked by Dice similarity of
+their full trigram sets, so common trigrams never get scanned.
+"""
+
+from array import array
+from bisect import bisect_left
+from collections import Counter
+
+# Rarest query trigrams whose postings are gathered as fuzzy candidates
+CANDIDATE_TRIGRAMS = 5
+
+# Candidates, by most shared rare trigrams, that get scored exactly
+MAX_CANDIDATES = 50
+
+# Fuzzy matches scoring below this are dropped
+MIN_SCORE = 0.3
+
+
+class NameIndex():
+
+    def __init__(self, names):
+        """
+        Indexes `names`, a map of lowercase name -> person ids.
+        """
+        self.names = names
+        self.keys = sorted(names)
+        self.postings = {}
+        self.sizes = array("H")
+        for position, key in enumerate(self.keys):
+            key_trigrams = trigrams(key)
+            self.sizes.append(min(len(key_trigrams), 0xFFFF))
+            for trigram in key_trigrams:
+                self.postings.setdefault(trigram, array("i")).append(position)
+
+    def prefix(self, text, limit=10):
+        """
+        Returns up to `limit` names starting with `text`, in order.
+        """
+        text = text.lower()
+        matches = []
+        i = bisect_left(self.keys, text)
+        while (i < len(self.keys) and len(matches) < limit
+               and self.keys[i].startswith(text)):
+            matches.append(self.keys[i])
+            i += 1
+        return matches
+
+    def fuzzy(self, text, limit=10):
+        """
+        Returns up to `limit` (score, name) pairs for names similar to
+        `text`, best first, with scores in (0, 1].
+        """
+        query = trigrams(text.lower())
+        if not query:
+            return []
+        rare = sorted((trigram for trigram in query
+                       if trigram in self.postings),
+                      key=lambda trigram: len(self.postings[trigram]))
+        candidates = Counter()
+        for trigram in rare[:CANDIDATE_TRIGRAMS]:
+            candidates.update(self.postings[trigram])
+
+        scored = []
+        for position, _ in candidates.most_common(MAX_CANDIDATES):
+            key = self.keys[position]
+            score = (2 * len(query & trigrams(key))
+                     / (len(query) + self.sizes[position]))
+            if score >= MIN_SCORE:
+                scored.append((score, key))
+        scored.sort(key=lambda match: (-match[0], match[1]))
+        return scored[:limit]
+
+    def search(self, text, limit=10):
+        """
+        Returns up to `limit` ranked (score, person_id, name) candidates:
+        exact matches score 1.0, then prefix matches, then fuzzy ones.
+        """
+        key = text.lower()
+        ranked = []
+        seen = set()
+
+        def add(score, name):
+            if name not in seen:
+                seen.add(name)
+                for person_id in sorted(self.names[name]):
+                    ranked.append((score, person_id, name))
+
+        if key in self.names:
+            add(1.0, key)
+        for name in self.prefix(key, limit):
+            # Shorter completions of the prefix rank higher
+            add(0.5 + 0.49 * len(key) / len(name), name)
+        for score, name in self.fuzzy(key, limit):
+            add(min(score, 0.99), name)
+        ranked.sort(key=lambda match: -match[0])
+        return ranked[:limit]
+
+
+def trigrams(text):
+    """
+    Returns the set of trigrams of `text`, padded so that word starts
+    and ends form trigrams of their own.
+    """
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
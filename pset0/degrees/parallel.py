@@ -0,0 +1,194 @@
+"""
+Level-synchronous parallel breadth-first search over a CompactGraph.
+
+The CSR arrays, plus the visited-person and scanned-movie flags, live
+in shared memory blocks that worker processes attach to by name, so
+nothing but frontier chunks and discoveries is pickled. During a level
+the workers only read the flags; the parent merges their discoveries
+and updates the flags before the next level starts.
+"""
+
+import multiprocessing
+import threading
+from array import array
+from multiprocessing import shared_memory
+
+from graph import INDEX
+
+# Levels smaller than this are expanded in the parent process
+PARALLEL_THRESHOLD = 2048
+
+# Frontier chunks per worker and level, to even out uneven degrees
+CHUNKS_PER_WORKER = 4
+
+# Shared arrays attached by each worker process
+_worker = {}
+
+
+class ParallelSearch():
+    """
+    Pool of `workers` processes searching a CompactGraph. Use as a
+    context manager, or call close() to release the pool and memory.
+    """
+
+    def __init__(self, graph, workers):
+        self.workers = workers
+        self.blocks = {}
+        self.arrays = {}
+        for name in ("person_offsets", "person_movies",
+                     "movie_offsets", "movie_stars"):
+            self._share(name, getattr(graph, name))
+        self._share("visited", bytes(len(graph.person_ids)))
+        self._share("movie_seen", bytes(len(graph.movie_ids)))
+        self.n_people = len(graph.person_ids)
+        self.stats = {"levels": 0, "parallel_levels": 0, "expanded": 0}
+        # The shared flags allow one search at a time
+        self.lock = threading.Lock()
+
+        layout = {name: (self.blocks[name].name, view.format, view.nbytes)
+                  for name, view in self.arrays.items()}
+        self.pool = multiprocessing.Pool(
+            workers, initializer=_attach, initargs=(layout,))
+
+    def _share(self, name, values):
+        """
+        Copies `values` (an array, memoryview or bytes) into a new
+        shared memory block and keeps a typed view of it.
+        """
+        source = memoryview(values)
+        raw = source.cast("B")
+        block = shared_memory.SharedMemory(create=True,
+                                           size=max(1, raw.nbytes))
+        block.buf[:raw.nbytes] = raw
+        self.blocks[name] = block
+        self.arrays[name] = block.buf[:raw.nbytes].cast(source.format)
+
+    def shortest_path(self, source, target):
+        """
+        Returns the shortest path of (movie, person) indices from
+        person index source to target, or None if they are not connected.
+        """
+        with self.lock:
+            return self._search(source, target)
+
+    def _search(self, source, target):
+        self.stats.update(levels=0, parallel_levels=0, expanded=0)
+        if source == target:
+            return []
+        visited = self.arrays["visited"]
+        movie_seen = self.arrays["movie_seen"]
+        visited[:] = bytes(len(visited))
+        movie_seen[:] = bytes(len(movie_seen))
+        parent = array(INDEX, [-1]) * self.n_people
+        action = array(INDEX, [-1]) * self.n_people
+
+        visited[source] = 1
+        level = [source]
+        while level:
+            self.stats["levels"] += 1
+            self.stats["expanded"] += len(level)
+            next_level = []
+            for found, movies in self._expand(level):
+                for movie in movies:
+                    movie_seen[movie] = 1
+                for star, person, movie in found:
+                    if visited[star]:
+                        continue
+                    visited[star] = 1
+                    parent[star] = person
+                    action[star] = movie
+                    next_level.append(star)
+            if visited[target]:
+                return _walk(parent, action, source, target)
+            level = next_level
+        return None
+
+    def _expand(self, level):
+        """
+        Yields (found, movies) results covering every person in level.
+        """
+        if len(level) < PARALLEL_THRESHOLD or self.workers == 1:
+            yield expand_level(self.arrays, level)
+            return
+        self.stats["parallel_levels"] += 1
+        chunks = self.workers * CHUNKS_PER_WORKER
+        size = -(-len(level) // chunks)
+        yield from self.pool.imap(
+            _expand_chunk,
+            (level[i:i + size] for i in range(0, len(level), size)))
+
+    def close(self):
+        self.pool.terminate()
+        self.pool.join()
+        for view in self.arrays.values():
+            view.release()
+        for block in self.blocks.values():
+            block.close()
+            block.unlink()
+        self.arrays.clear()
+        self.blocks.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def expand_level(arrays, level):
+    """
+    Returns (found, movies) for the people in `level`: `found` lists
+    (star, person, movie) for each star not yet visited, and `movies`
+    lists the movies scanned to find them.
+    """
+    person_offsets = arrays["person_offsets"]
+    person_movies = arrays["person_movies"]
+    movie_offsets = arrays["movie_offsets"]
+    movie_stars = arrays["movie_stars"]
+    visited = arrays["visited"]
+    movie_seen = arrays["movie_seen"]
+
+    found = []
+    movies = []
+    scanned = set()
+    reached = set()
+    for person in level:
+        for i in range(person_offsets[person], person_offsets[person + 1]):
+            movie = person_movies[i]
+            if movie_seen[movie] or movie in scanned:
+                continue
+            scanned.add(movie)
+            movies.append(movie)
+            for j in range(movie_offsets[movie], movie_offsets[movie + 1]):
+                star = movie_stars[j]
+                if not visited[star] and star not in reached:
+                    reached.add(star)
+                    found.append((star, person, movie))
+    return found, movies
+
+
+def _attach(layout):
+    """
+    Pool initializer: maps the shared blocks named in `layout`.
+    """
+    for name, (block_name, typecode, nbytes) in layout.items():
+        block = shared_memory.SharedMemory(name=block_name)
+        _worker[f"{name}_block"] = block
+        _worker[name] = block.buf[:nbytes].cast(typecode)
+
+
+def _expand_chunk(level):
+    return expand_level(_worker, level)
+
+
+def _walk(parent, action, source, target):
+    """
+    Returns the (movie, person) path to target along parent pointers.
+    """
+    path = []
+    person = target
+    while person != source:
+        path.append((action[person], person))
+        person = parent[person]
+    path.reverse()
+    return path
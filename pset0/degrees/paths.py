@@ -0,0 +1,162 @@
+"""
+Path enumeration engines for degrees.
+
+Like the engines in degrees.py these take source and target states and
+a `neighbors(state)` function yielding (action, state) pairs, and
+return paths as lists of (action, state). Results are generators, so
+callers can stop after the first few paths.
+"""
+
+
+def shortest_path_dag(source, target, neighbors, max_depth=None):
+    """
+    Runs a bidirectional BFS that keeps every parent one layer closer
+    to its root, stopping at the first layer where the sides meet or
+    once no path of at most `max_depth` steps can exist.
+
+    Returns (forward, backward, meetings): parent lists for each side
+    and the people through which all shortest paths pass, or None if
+    there is no such path.
+    """
+    if source == target:
+        return {source: []}, {target: []}, [source]
+
+    # Each side maps a reached person to its depth, and to its parents
+    forward_depth, backward_depth = {source: 0}, {target: 0}
+    forward, backward = {source: []}, {target: []}
+    forward_level, backward_level = [source], [target]
+    reached = 0
+
+    while forward_level and backward_level:
+        if max_depth is not None and reached >= max_depth:
+            return None
+        if len(forward_level) <= len(backward_level):
+            level, depths, parents = forward_level, forward_depth, forward
+            other = backward_depth
+        else:
+            level, depths, parents = backward_level, backward_depth, backward
+            other = forward_depth
+
+        depth = depths[level[0]] + 1
+        next_level = []
+        for person in level:
+            for action, neighbor in neighbors(person):
+                seen = depths.get(neighbor)
+                if seen is None:
+                    depths[neighbor] = depth
+                    parents[neighbor] = [(person, action)]
+                    next_level.append(neighbor)
+                elif seen == depth:
+                    parents[neighbor].append((person, action))
+        reached += 1
+
+        lengths = {person: depth + other[person]
+                   for person in next_level if person in other}
+        if lengths:
+            shortest = min(lengths.values())
+            if max_depth is not None and shortest > max_depth:
+                return None
+            meetings = [person for person, length in lengths.items()
+                        if length == shortest]
+            return forward, backward, meetings
+
+        if depths is forward_depth:
+            forward_level = next_level
+        else:
+            backward_level = next_level
+    return None
+
+
+def all_shortest_paths(source, target, neighbors, max_depth=None):
+    """
+    Yields every shortest path from source to target, built lazily from
+    the layer DAG without searching again. Yields nothing if they are
+    not connected within `max_depth` steps.
+    """
+    dag = shortest_path_dag(source, target, neighbors, max_depth)
+    if dag is None:
+        return
+    forward, backward, meetings = dag
+    for meeting in meetings:
+        for prefix in _prefixes(forward, meeting):
+            for suffix in _suffixes(backward, meeting):
+                yield prefix + suffix
+
+
+def _prefixes(forward, person):
+    """
+    Yields each path from the forward root to `person`.
+    """
+    if not forward[person]:
+        yield []
+        return
+    for parent, action in forward[person]:
+        for prefix in _prefixes(forward, parent):
+            yield prefix + [(action, person)]
+
+
+def _suffixes(backward, person):
+    """
+    Yields each path from `person` to the backward root.
+    """
+    if not backward[person]:
+        yield []
+        return
+    for parent, action in backward[person]:
+        for suffix in _suffixes(backward, parent):
+            yield [(action, parent)] + suffix
+
+
+def distances_within(root, neighbors, max_depth):
+    """
+    Returns {state: distance} for every state within `max_depth` steps
+    of root.
+    """
+    distance = {root: 0}
+    level = [root]
+    for depth in range(1, max_depth + 1):
+        next_level = []
+        for person in level:
+            for _, neighbor in neighbors(person):
+                if neighbor not in distance:
+                    distance[neighbor] = depth
+                    next_level.append(neighbor)
+        if not next_level:
+            break
+        level = next_level
+    return distance
+
+
+def paths_within(source, target, neighbors, max_depth):
+    """
+    Yields every simple path from source to target with at most
+    `max_depth` steps, shortest paths not necessarily first.
+
+    A BFS from target bounded at `max_depth` gives each person's
+    distance to target; the depth-first walk from source never enters
+    a person that cannot still reach target in the steps left, and
+    stops at once if source is not within reach.
+    """
+    to_target = distances_within(target, neighbors, max_depth)
+    if source not in to_target:
+        return
+    path = []
+    on_path = {source}
+
+    def extend(person, steps_left):
+        if person == target:
+            yield list(path)
+            return
+        for action, neighbor in neighbors(person):
+            if neighbor in on_path:
+                continue
+            remaining = to_target.get(neighbor)
+            if remaining is None or remaining > steps_left - 1:
+                continue
+            path.append((action, neighbor))
+            on_path.add(neighbor)
+            yield from extend(neighbor, steps_left - 1)
+            on_path.discard(neighbor)
+            path.pop()
+
+    yield from extend(source, max_depth)
@@ -0,0 +1,199 @@
+"""
+Batch and long-lived server front ends for degrees queries.
+
+Both take an `answer(source_name, target_name)` function returning a
+JSON-serializable dict, so the graph is loaded once by the caller and
+stays resident while queries are answered from a thread pool.
+"""
+
+import csv
+import json
+import os
+import queue
+import socketserver
+import stat
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+def run_batch(lines, out, answer, workers=4):
+    """
+    Answers every `source,target` line of `lines`, writing one JSON
+    object per line to `out` in input order, and returns the list of
+    per-query latencies in seconds.
+
+    Each result is written as soon as it and those before it are done,
+    with at most about 2 * workers queries read ahead, so results stream
+    out while input is still arriving.
+    """
+    pairs = (row for row in csv.reader(lines) if row)
+    latencies = []
+    errors = []
+    pending = queue.Queue(maxsize=2 * workers)
+
+    def write():
+        while True:
+            future = pending.get()
+            if future is None:
+                return
+            if errors:
+                # Keep draining so the reader never blocks on a full queue
+                continue
+            try:
+                result, seconds = future.result()
+                latencies.append(seconds)
+                out.write(json.dumps(result) + "\n")
+                out.flush()
+            except BaseException as e:
+                errors.append(e)
+
+    writer = threading.Thread(target=write, daemon=True)
+    writer.start()
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            for row in pairs:
+                if errors:
+                    break
+                pending.put(pool.submit(timed, answer, row))
+    finally:
+        pending.put(None)
+        writer.join()
+    if errors:
+        raise errors[0]
+    return latencies
+
+
+def timed(answer, row):
+    """
+    Returns (result, seconds) for answering one parsed input row.
+    """
+    start = time.perf_counter()
+    if len(row) != 2:
+        result = {"error": "expected source,target", "input": row}
+    else:
+        result = answer(row[0].strip(), row[1].strip())
+    return result, time.perf_counter() - start
+
+
+def percentiles(latencies, points=(50, 90, 99)):
+    """
+    Returns {"p50": ..., ..., "max": ...} in milliseconds, using the
+    nearest-rank method.
+    """
+    if not latencies:
+        return {}
+    ordered = sorted(latencies)
+    summary = {}
+    for point in points:
+        rank = max(0, -(-point * len(ordered) // 100) - 1)
+        summary[f"p{point}"] = 1000 * ordered[rank]
+    summary["max"] = 1000 * ordered[-1]
+    return summary
+
+
+def report(latencies, file=sys.stderr):
+    """
+    Prints the query count and latency percentiles to `file`.
+    """
+    summary = percentiles(latencies)
+    print(f"{len(latencies)} queries; latency ms: " + ", ".join(
+        f"{name}={value:.3f}" for name, value in summary.items()),
+        file=file)
+
+
+class PoolMixIn():
+    """
+    Socket server mix-in handing each connection to a fixed-size thread
+    pool instead of a new thread per connection.
+    """
+    workers = 4
+
+    def serve_forever(self, *args, **kwargs):
+        with ThreadPoolExecutor(max_workers=self.workers) as self.pool:
+            super().serve_forever(*args, **kwargs)
+
+    def process_request(self, request, client_address):
+        self.pool.submit(self.process_request_thread, request, client_address)
+
+    def process_request_thread(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+
+class LineHandler(socketserver.StreamRequestHandler):
+    """
+    Reads `source,target` lines and replies with one JSON line each.
+    """
+
+    def handle(self):
+        for line in self.rfile:
+            row = next(csv.reader([line.decode("utf-8")]), [])
+            if not row:
+                continue
+            result, _ = timed(self.server.answer, row)
+            self.wfile.write(json.dumps(result).encode("utf-8") + b"\n")
+            self.wfile.flush()
+
+
+class QueryHandler(BaseHTTPRequestHandler):
+    """
+    Answers GET /?source=NAME&target=NAME with a JSON object.
+    """
+
+    def do_GET(self):
+        query = parse_qs(urlparse(self.path).query)
+        row = query.get("source", []) + query.get("target", [])
+        result, _ = timed(self.server.answer, row)
+        body = json.dumps(result).encode("utf-8")
+        self.send_response(400 if "error" in result else 200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class UnixServer(PoolMixIn, socketserver.UnixStreamServer):
+    pass
+
+
+class HttpServer(PoolMixIn, HTTPServer):
+    pass
+
+
+def serve(address, answer, workers=4):
+    """
+    Serves queries until interrupted. `address` is "unix:PATH" for a
+    line protocol on a Unix socket, or "http:PORT" for HTTP on localhost.
+    """
+    kind, _, where = address.partition(":")
+    if kind == "unix":
+        # A socket left behind by an earlier server would block the bind
+        if os.path.exists(where) and stat.S_ISSOCK(os.stat(where).st_mode):
+            os.remove(where)
+        server = UnixServer(where, LineHandler)
+    elif kind == "http":
+        server = HttpServer(("127.0.0.1", int(where)), QueryHandler)
+    else:
+        raise ValueError(f"unknown address {address!r}")
+    server.answer = answer
+    server.workers = workers
+    print(f"Serving on {address} with {workers} workers.", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if kind == "unix":
+            os.remove(where)
@@ -1,9 +1,32 @@
+import sys
+import threading
+from collections import Counter, OrderedDict, deque
+
+
 class Node():
+    """
+    Search node; `parent` is the Node it was reached from (or None),
+    so the path back to the root is a walk of parent pointers.
+    """
+    __slots__ = ("state", "parent", "action")
+
     def __init__(self, state, parent, action):
         self.state = state
         self.parent = parent
         self.action = action
 
+    def path(self):
+        """
+        Returns the (action, state) pairs leading from the root to this node.
+        """
+        steps = []
+        node = self
+        while node.parent is not None:
+            steps.append((node.action, node.state))
+            node = node.parent
+        steps.reverse()
+        return steps
+
 
 class StackFrontier():
     def __init__(self):
@@ -36,3 +59,207 @@ class QueueFrontier(StackFrontier):
             node = self.frontier[0]
             self.frontier = self.frontier[1:]
             return node
+
+
+class HashedStackFrontier():
+    """
+    Stack frontier that also counts the states it holds, so that
+    contains_state and remove run in constant time.
+    """
+
+    def __init__(self):
+        self.frontier = []
+        self.states = {}
+
+    def add(self, node):
+        self.frontier.append(node)
+        self.states[node.state] = self.states.get(node.state, 0) + 1
+
+    def contains_state(self, state):
+        return state in self.states
+
+    def isempty(self):
+        return len(self.frontier) == 0
+
+    def __len__(self):
+        return len(self.frontier)
+
+    def _forget(self, node):
+        count = self.states[node.state] - 1
+        if count:
+            self.states[node.state] = count
+        else:
+            del self.states[node.state]
+        return node
+
+    def remove(self):
+        if self.isempty():
+            raise Exception("empty frontier")
+        else:
+            return self._forget(self.frontier.pop())
+
+
+class HashedQueueFrontier(HashedStackFrontier):
+    """
+    Queue frontier backed by a deque, with constant time membership.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.frontier = deque()
+
+    def remove(self):
+        if self.isempty():
+            raise Exception("empty frontier")
+        else:
+            return self._forget(self.frontier.popleft())
+
+
+# Distinct uncached sources TreeCache counts before starting over
+REQUEST_HISTORY = 1 << 16
+
+
+class SourceTree():
+    """
+    Breadth-first tree from one source state: the distance, parent
+    state and action for every reached state. The mappings are dicts,
+    or arrays indexed by state that hold -1 for unreached states.
+    """
+
+    def __init__(self, source, distance, parent, action):
+        self.source = source
+        self.distance = distance
+        self.parent = parent
+        self.action = action
+
+    def distance_to(self, state):
+        try:
+            distance = self.distance[state]
+        except (KeyError, IndexError):
+            return None
+        return None if distance < 0 else distance
+
+    def path(self, target):
+        """
+        Returns the (action, state) pairs leading from the source to
+        target, or None if target was not reached.
+        """
+        if self.distance_to(target) is None:
+            return None
+        steps = []
+        state = target
+        while state != self.source:
+            steps.append((self.action[state], state))
+            state = self.parent[state]
+        steps.reverse()
+        return steps
+
+    @property
+    def nbytes(self):
+        """
+        Approximate memory held by the tree's own mappings.
+        """
+        total = 0
+        for mapping in (self.distance, self.parent, self.action):
+            if hasattr(mapping, "itemsize"):
+                total += mapping.itemsize * len(mapping)
+            else:
+                total += sys.getsizeof(mapping)
+        return total
+
+
+class TreeCache():
+    """
+    Least-recently-used cache of SourceTrees bounded by total bytes.
+
+    A tree is only built for a source once it has been asked for
+    `admit_after` times, so one-off sources do not evict hot ones.
+    Sources whose tree turned out larger than the whole budget are not
+    admitted again.
+    """
+
+    def __init__(self, max_bytes, admit_after=2):
+        self.max_bytes = max_bytes
+        self.admit_after = admit_after
+        self.trees = OrderedDict()
+        self.requests = Counter()
+        self.rejected = set()
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+
+    def get(self, source):
+        """
+        Returns the cached tree for source, or None after counting the miss.
+        """
+        with self.lock:
+            tree = self.trees.get(source)
+            if tree is not None:
+                self.trees.move_to_end(source)
+                self.hits += 1
+                return tree
+            self.misses += 1
+            # Forget old request counts rather than let them grow unbounded
+            if len(self.requests) >= REQUEST_HISTORY:
+                self.requests.clear()
+            self.requests[source] += 1
+            return None
+
+    def clear(self):
+        """
+        Drops every tree, request count and rejection, as after loading
+        new data; the hit and miss counts are kept.
+        """
+        with self.lock:
+            self.trees.clear()
+            self.requests.clear()
+            self.rejected.clear()
+            self.nbytes = 0
+
+    def should_admit(self, source):
+        return (source not in self.rejected
+                and self.requests[source] >= self.admit_after)
+
+    def fits(self, nbytes):
+        """
+        Returns whether a tree of `nbytes` could be cached at all.
+        """
+        return nbytes <= self.max_bytes
+
+    def put(self, tree):
+        """
+        Caches tree, evicting least recently used trees to stay in budget.
+        Trees larger than the whole budget are not cached, and their
+        source is rejected from then on.
+        """
+        size = tree.nbytes
+        with self.lock:
+            if not self.fits(size):
+                if len(self.rejected) >= REQUEST_HISTORY:
+                    self.rejected.clear()
+                self.rejected.add(tree.source)
+                self.requests.pop(tree.source, None)
+                return
+            if tree.source in self.trees:
+                return
+            while self.nbytes + size > self.max_bytes:
+                _, evicted = self.trees.popitem(last=False)
+                self.nbytes -= evicted.nbytes
+                self.evictions += 1
+            self.trees[tree.source] = tree
+            self.nbytes += size
+            self.requests.pop(tree.source, None)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "trees": len(self.trees),
+            "bytes": self.nbytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "rejected": len(self.rejected),
+        }
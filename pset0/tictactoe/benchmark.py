@@ -0,0 +1,416 @@
+"""
+Benchmarks and correctness checks for the tictactoe players.
+
+Usage: python benchmark.py minimax [--sample N]
+       python benchmark.py api [--repeat N]
+       python benchmark.py book
+       python benchmark.py mnk [--budget SECONDS] [--plies N]
+       python benchmark.py parallel [--depth D] [--workers N ...]
+       python benchmark.py symmetry
+       python benchmark.py mcts [--games N] [--playouts N ...]
+
+minimax checks that minimax picks a move of optimal value in every
+reachable position, and compares its latency and positions searched per
+move with the original minimax_sumv player. api times each game function
+on list boards and on bitboards over every reachable position. book
+reports the opening book's build time, size and lookup latency. mnk
+checks the m,n,k engine on 3x3 and plays it against itself on larger
+boards, reporting latency per move and depth reached. parallel times
+fixed-depth root-split searches at each worker count against serial.
+symmetry measures how far canonical keys cut the states searched. mcts
+reports MCTS playouts per second and its results against minimax.
+"""
+
+import argparse
+import math
+import multiprocessing
+import os
+import random
+import tempfile
+import time
+from functools import lru_cache
+
+import bitboard
+import book
+import mnk
+import symmetry
+import tictactoe as ttt
+import tournament
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    commands = parser.add_subparsers(dest="command", required=True)
+    minimax = commands.add_parser(
+        "minimax", help="optimality, latency and nodes per move")
+    minimax.add_argument("--sample", type=int, default=100,
+                         help="positions timed for each player")
+    api = commands.add_parser("api", help="game functions per board type")
+    api.add_argument("--repeat", type=int, default=5,
+                     help="passes over all positions")
+    commands.add_parser("book", help="opening book build and lookups")
+    games = commands.add_parser("mnk", help="m,n,k engine self-play")
+    games.add_argument("--budget", type=float, default=mnk.MOVE_BUDGET,
+                       help="seconds per move")
+    games.add_argument("--plies", type=int, default=20,
+                       help="moves played per game at most")
+    parallel = commands.add_parser(
+        "parallel", help="root-split search latency across workers")
+    parallel.add_argument("--depth", type=int, default=3,
+                          help="plies searched per move")
+    parallel.add_argument("--workers", type=int, nargs="+",
+                          default=[1, 2, 4, 8])
+    commands.add_parser("symmetry", help="states searched per key type")
+    strength = commands.add_parser("mcts", help="MCTS speed and strength")
+    strength.add_argument("--games", type=int, default=100,
+                          help="games against each opponent")
+    strength.add_argument("--playouts", type=int, nargs="+",
+                          default=[100, 500, 2000])
+    args = parser.parse_args()
+
+    if args.command == "minimax":
+        positions = reachable_positions()
+        print(f"{len(positions)} reachable non-terminal positions")
+        check_optimal(positions)
+        sample = random.Random(50).sample(
+            positions, min(args.sample, len(positions)))
+        compare_players(sample)
+    elif args.command == "api":
+        compare_boards(reachable_positions(), args.repeat)
+    elif args.command == "book":
+        benchmark_book(reachable_positions())
+    elif args.command == "mnk":
+        benchmark_mnk(reachable_positions(), args.budget, args.plies)
+    elif args.command == "parallel":
+        benchmark_parallel(args.depth, args.workers)
+    elif args.command == "symmetry":
+        benchmark_symmetry(reachable_positions())
+    elif args.command == "mcts":
+        benchmark_mcts(args.games, args.playouts)
+
+
+def reachable_positions():
+    """
+    Returns every non-terminal board reachable from the initial state.
+    """
+    found = {}
+
+    def visit(board):
+        key = tuple(cell for row in board for cell in row)
+        if key in found or ttt.terminal(board):
+            return
+        found[key] = board
+        for action in ttt.actions(board):
+            visit(ttt.result(board, action))
+
+    visit(ttt.initial_state())
+    return list(found.values())
+
+
+@lru_cache(maxsize=None)
+def value(cells):
+    """
+    Exact minimax value for X of the board with row-major `cells`, by
+    plain exhaustive search.
+    """
+    board = [list(cells[i:i + 3]) for i in range(0, 9, 3)]
+    if ttt.terminal(board):
+        return ttt.utility(board)
+    values = [value(flatten(ttt.result(board, action)))
+              for action in ttt.actions(board)]
+    return max(values) if ttt.player(board) == ttt.X else min(values)
+
+
+def flatten(board):
+    return tuple(cell for row in board for cell in row)
+
+
+def check_optimal(positions):
+    """
+    Raises AssertionError unless minimax's move keeps the game value in
+    every position, both from the book and by search.
+    """
+    for use_book in (True, False):
+        for board in positions:
+            move = ttt.minimax(board, book=use_book)
+            if (value(flatten(ttt.result(board, move)))
+                    != value(flatten(board))):
+                raise AssertionError(f"suboptimal move {move} on {board}")
+    print("minimax is optimal in every position")
+
+
+def compare_players(sample):
+    """
+    Prints mean and worst latency and positions searched per move.
+    """
+    players = [
+        ("book", ttt.minimax),
+        ("minimax (cold)", lambda board: (
+            ttt.clear_cache(), ttt.minimax(board, book=False))),
+        ("minimax (warm)", lambda board: ttt.minimax(board, book=False)),
+        ("no symmetry", lambda board: (
+            ttt.clear_cache(),
+            ttt.minimax(board, symmetry=False, book=False))),
+        ("minimax_sumv", ttt.minimax_sumv),
+    ]
+    print(f"{'player':<16}{'mean ms':>10}{'max ms':>10}{'mean nodes':>12}")
+    for name, play in players:
+        times = []
+        nodes = 0
+        for board in sample:
+            start = time.perf_counter()
+            play(board)
+            times.append(time.perf_counter() - start)
+            nodes += ttt.search_stats["nodes"]
+        print(f"{name:<16}{1000 * sum(times) / len(times):>10.3f}"
+              f"{1000 * max(times):>10.3f}{nodes / len(sample):>12.1f}")
+
+
+def compare_boards(positions, repeat):
+    """
+    Prints the mean time per call of each game function on list boards
+    and on the equivalent bitboards, and checks they agree.
+    """
+    compact = [bitboard.encode(board) for board in positions]
+    moves = [next(iter(ttt.actions(board))) for board in positions]
+    for board, encoded in zip(positions, compact):
+        if (bitboard.decode(encoded) != board
+                or ttt.actions(encoded) != ttt.actions(board)
+                or ttt.winner(encoded) != ttt.winner(board)):
+            raise AssertionError(f"bitboard disagrees on {board}")
+
+    functions = [
+        ("player", lambda boards: [ttt.player(b) for b in boards]),
+        ("actions", lambda boards: [ttt.actions(b) for b in boards]),
+        ("result", lambda boards: [ttt.result(b, m)
+                                   for b, m in zip(boards, moves)]),
+        ("winner", lambda boards: [ttt.winner(b) for b in boards]),
+        ("terminal", lambda boards: [ttt.terminal(b) for b in boards]),
+        ("utility", lambda boards: [ttt.utility(b) for b in boards]),
+        ("encode", lambda boards: [bitboard.encode(b) for b in positions]),
+        ("decode", lambda boards: [bitboard.decode(b) for b in compact]),
+    ]
+    calls = repeat * len(positions)
+    print(f"{'function':<10}{'list us':>10}{'bitboard us':>13}{'speedup':>9}")
+    for name, run in functions:
+        seconds = []
+        for boards in (positions, compact):
+            start = time.perf_counter()
+            for _ in range(repeat):
+                run(boards)
+            seconds.append(time.perf_counter() - start)
+        if name in ("encode", "decode"):
+            print(f"{name:<10}{'':>10}{1e6 * seconds[1] / calls:>13.2f}")
+        else:
+            print(f"{name:<10}{1e6 * seconds[0] / calls:>10.2f}"
+                  f"{1e6 * seconds[1] / calls:>13.2f}"
+                  f"{seconds[0] / seconds[1]:>8.1f}x")
+
+
+def benchmark_book(positions):
+    """
+    Prints the book's build time, file size, load time and per-move
+    latency against search, and checks minimax falls back to search
+    when the book is corrupt.
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "tictactoe.book")
+        ttt.clear_cache()
+        start = time.perf_counter()
+        moves = book.solve()
+        book.save(moves, path)
+        print(f"build:  {time.perf_counter() - start:.3f}s, "
+              f"{len(moves)} positions, {os.path.getsize(path)} bytes")
+
+        start = time.perf_counter()
+        loaded = book.load(path)
+        print(f"load:   {1000 * (time.perf_counter() - start):.2f} ms")
+        if loaded != moves:
+            raise AssertionError("book changed in save and load")
+
+        with open(path, "r+b") as f:
+            f.seek(-1, os.SEEK_END)
+            last = f.read(1)
+            f.seek(-1, os.SEEK_END)
+            f.write(bytes([last[0] ^ 1]))
+        try:
+            book.load(path)
+            raise AssertionError("corrupt book loaded")
+        except ValueError as e:
+            print(f"corrupt book rejected: {e}")
+
+    for name, use_book in (("lookup", True), ("search", False)):
+        ttt.clear_cache()
+        start = time.perf_counter()
+        for board in positions:
+            ttt.minimax(board, book=use_book)
+        seconds = time.perf_counter() - start
+        print(f"{name + ':':<8}{1e6 * seconds / len(positions):.2f} us/move")
+
+
+def benchmark_mnk(positions, budget, plies):
+    """
+    Checks the engine plays 3x3 grids perfectly, then prints latency,
+    depth and speed of self-play on larger boards.
+    """
+    for board in positions:
+        move = ttt.minimax(mnk.Grid([row.copy() for row in board], 3))
+        if value(flatten(ttt.result(board, move))) != value(flatten(board)):
+            raise AssertionError(f"suboptimal mnk move {move} on {board}")
+    print("mnk engine is optimal on every 3x3 position")
+
+    print(f"{'game':<10}{'plies':>6}{'winner':>8}{'mean ms':>10}"
+          f"{'max ms':>10}{'depth':>7}{'nodes/s':>10}")
+    for m, n, k in [(4, 4, 4), (7, 7, 4), (15, 15, 5)]:
+        board = ttt.initial_state(m=m, n=n, k=k)
+        times, depths, nodes = [], [], 0
+        while not ttt.terminal(board) and len(times) < plies:
+            start = time.perf_counter()
+            move = ttt.minimax(board, budget=budget)
+            times.append(time.perf_counter() - start)
+            depths.append(ttt.search_stats["depth"])
+            nodes += ttt.search_stats["nodes"]
+            board = ttt.result(board, move)
+        print(f"{f'{m},{n},{k}':<10}{len(times):>6}"
+              f"{str(ttt.winner(board)):>8}"
+              f"{1000 * sum(times) / len(times):>10.1f}"
+              f"{1000 * max(times):>10.1f}"
+              f"{sum(depths) / len(depths):>7.1f}"
+              f"{nodes / sum(times):>10.0f}")
+
+
+def midgame_boards(count, plies=8):
+    """
+    Returns `count` 15,15,5 boards after `plies` random moves near the
+    centre.
+    """
+    rng = random.Random(17)
+    boards = []
+    for _ in range(count):
+        board = ttt.initial_state(m=15, n=15, k=5)
+        for _ in range(plies):
+            near = sorted((i, j) for i, j in ttt.actions(board)
+                          if 4 <= i <= 10 and 4 <= j <= 10)
+            board = ttt.result(board, rng.choice(near))
+        boards.append(board)
+    return boards
+
+
+def benchmark_parallel(depth, worker_counts):
+    """
+    Prints the mean latency of a `depth`-ply 15,15,5 move at each worker
+    count, checking every parallel move matches the serial one.
+    """
+    boards = midgame_boards(5)
+    print(f"{multiprocessing.cpu_count()} CPUs, depth {depth}")
+    start = time.perf_counter()
+    serial = [ttt.minimax(board, budget=math.inf, depth=depth)
+              for board in boards]
+    baseline = (time.perf_counter() - start) / len(boards)
+    print(f"{'workers':<10}{'mean ms':>10}{'speedup':>9}")
+    print(f"{'serial':<10}{1000 * baseline:>10.1f}{1.0:>8.2f}x")
+    for workers in worker_counts:
+        ttt.enable_parallel(workers)
+        try:
+            start = time.perf_counter()
+            moves = [ttt.minimax(board, budget=math.inf, depth=depth)
+                     for board in boards]
+            seconds = (time.perf_counter() - start) / len(boards)
+        finally:
+            ttt.enable_parallel(None)
+        if moves != serial:
+            raise AssertionError(f"{workers} workers chose {moves}, "
+                                 f"serial search {serial}")
+        print(f"{workers:<10}{1000 * seconds:>10.1f}"
+              f"{baseline / seconds:>8.2f}x")
+
+
+def benchmark_symmetry(positions):
+    """
+    Prints the states expanded by full-game searches keyed by exact
+    position and by canonical form, and checks canonical moves map back
+    to legal, equally good moves.
+    """
+    for board in positions:
+        canonical, s = symmetry.canonical(board)
+        for action in ttt.actions(canonical):
+            move = symmetry.from_canonical(action, s)
+            if (value(flatten(ttt.result(board, move)))
+                    != value(flatten(ttt.result(canonical, action)))):
+                raise AssertionError(f"{action} maps back to {move}")
+    print("canonical moves map back to equivalent moves")
+
+    def expand(board, seen, key):
+        """
+        Solves board by exhaustive search, expanding each key once.
+        """
+        k = key(board)
+        if k in seen:
+            return seen[k]
+        if bitboard.terminal(board):
+            seen[k] = bitboard.utility(board)
+            return seen[k]
+        values = [expand(bitboard.result(board, action), seen, key)
+                  for action in bitboard.actions(board)]
+        best = max if bitboard.player(board) == ttt.X else min
+        seen[k] = best(values)
+        return seen[k]
+
+    rows = []
+    for name, key in [
+            ("exact", lambda board: board.x << 9 | board.o),
+            ("canonical", lambda board: symmetry.key(board.x, board.o))]:
+        seen = {}
+        start = time.perf_counter()
+        expand(bitboard.Board(), seen, key)
+        seconds = time.perf_counter() - start
+        ttt.clear_cache()
+        ttt.minimax(ttt.initial_state(), symmetry=name == "canonical",
+                    book=False)
+        rows.append((name, len(seen), seconds,
+                     ttt.search_stats["nodes"]))
+    print(f"{'keys':<11}{'solve states':>13}{'solve ms':>10}"
+          f"{'alpha-beta nodes':>18}")
+    for name, states, seconds, nodes in rows:
+        print(f"{name:<11}{states:>13}{1000 * seconds:>10.1f}{nodes:>18}")
+    print(f"reduction  {rows[0][1] / rows[1][1]:>12.1f}x"
+          f"{rows[0][2] / rows[1][2]:>9.1f}x{rows[0][3] / rows[1][3]:>17.1f}x")
+
+
+def benchmark_mcts(games, playout_counts):
+    """
+    Prints MCTS playouts per second on several board sizes, then its
+    W/D/L as either side against minimax and random on 3x3 at each
+    playout count.
+    """
+    print(f"{'game':<10}{'playouts/s':>12}")
+    for m, n, k in [(3, 3, 3), (7, 7, 4), (15, 15, 5)]:
+        start = time.perf_counter()
+        ttt.mcts(ttt.initial_state(m=m, n=n, k=k), budget=1.0,
+                 reuse=False, seed=0)
+        seconds = time.perf_counter() - start
+        print(f"{f'{m},{n},{k}':<10}"
+              f"{ttt.search_stats['playouts'] / seconds:>12.0f}")
+
+    print(f"\n{'playouts':<10}{'opponent':<10}{'W':>5}{'D':>5}{'L':>5}"
+          f"{'ms/move':>9}")
+    default = ttt.MCTS_PLAYOUTS
+    try:
+        for playouts in playout_counts:
+            ttt.MCTS_PLAYOUTS = playouts
+            for opponent in ("minimax", "random"):
+                results = tournament.run(["mcts", opponent], games,
+                                         (3, 3, 3), processes=1)
+                outcomes = [game["winner"] for game in results]
+                latencies = [latency for game in results
+                             for latency in game["latencies"][0]]
+                print(f"{playouts:<10}{opponent:<10}"
+                      f"{outcomes.count(0):>5}{outcomes.count(None):>5}"
+                      f"{outcomes.count(1):>5}"
+                      f"{1000 * sum(latencies) / len(latencies):>9.2f}")
+    finally:
+        ttt.MCTS_PLAYOUTS = default
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""
+Bitboard representation of the tic tac toe board.
+
+Each side's marks are a 9-bit integer mask, with cell (i, j) at bit
+3 * i + j. Wins are read from a table indexed by mask, built from the 8
+winning lines, so no function here loops over the cells.
+"""
+
+X = "X"
+O = "O"
+EMPTY = None
+
+# All 9 cells
+FULL = 0x1FF
+
+# Rows, columns and diagonals
+WIN_MASKS = [
+    0b000000111, 0b000111000, 0b111000000,
+    0b001001001, 0b010010010, 0b100100100,
+    0b100010001, 0b001010100,
+]
+
+# WON[mask] is True when mask covers a winning line
+WON = [any(mask & line == line for line in WIN_MASKS)
+       for mask in range(FULL + 1)]
+
+# MOVES[empty] are the (i, j) cells set in the empty-cell mask
+MOVES = [frozenset((cell // 3, cell % 3) for cell in range(9)
+                   if empty >> cell & 1)
+         for empty in range(FULL + 1)]
+
+
+class Board():
+    """
+    Board as a pair of masks, x and o. Indexing gives rows as tuples of
+    X, O and EMPTY, so code written for the list board can read it.
+    """
+
+    __slots__ = ("x", "o")
+
+    def __init__(self, x=0, o=0):
+        self.x = x
+        self.o = o
+
+    def __getitem__(self, i):
+        if not 0 <= i < 3:
+            raise IndexError("board row out of range")
+        return tuple(X if self.x >> cell & 1 else O if self.o >> cell & 1
+                     else EMPTY for cell in range(3 * i, 3 * i + 3))
+
+    def __iter__(self):
+        return (self[i] for i in range(3))
+
+    def __len__(self):
+        return 3
+
+    def __eq__(self, other):
+        return (isinstance(other, Board)
+                and self.x == other.x and self.o == other.o)
+
+    def __hash__(self):
+        return self.x << 9 | self.o
+
+    def __repr__(self):
+        return f"Board(x={self.x:#05x}, o={self.o:#05x})"
+
+
+def encode(board):
+    """
+    Returns the Board for a list-of-lists board.
+    """
+    x = o = 0
+    for i, row in enumerate(board):
+        for j, cell in enumerate(row):
+            if cell == X:
+                x |= 1 << (3 * i + j)
+            elif cell == O:
+                o |= 1 << (3 * i + j)
+    return Board(x, o)
+
+
+def decode(board):
+    """
+    Returns the list-of-lists board for a Board.
+    """
+    return [list(row) for row in board]
+
+
+def player(board):
+    return X if board.x.bit_count() == board.o.bit_count() else O
+
+
+def actions(board):
+    return set(MOVES[FULL & ~(board.x | board.o)])
+
+
+def result(board, action):
+    i, j = action
+    if not (0 <= i < 3 and 0 <= j < 3):
+        raise NameError('valid action!')
+    bit = 1 << (3 * i + j)
+    if (board.x | board.o) & bit:
+        raise NameError('valid action!')
+    if board.x.bit_count() == board.o.bit_count():
+        return Board(board.x | bit, board.o)
+    return Board(board.x, board.o | bit)
+
+
+def winner(board):
+    if WON[board.x]:
+        return X
+    elif WON[board.o]:
+        return O
+    return None
+
+
+def terminal(board):
+    return WON[board.x] or WON[board.o] or board.x | board.o == FULL
+
+
+def utility(board):
+    if WON[board.x]:
+        return 1
+    elif WON[board.o]:
+        return -1
+    return 0
@@ -0,0 +1,110 @@
+"""
+Perfect-play opening book for tic tac toe.
+
+Usage: python book.py [FILE]
+
+Solves every reachable position once and writes the best move of each to
+FILE (tictactoe.book next to this module by default), which minimax
+then answers from. Only the canonical form of each position is stored
+(see symmetry.py). The file is a header followed by sorted little-endian
+uint32 entries, each a canonical bitboard key (x << 9 | o) shifted left
+4 bits above the row-major index of the move on that canonical board.
+"""
+
+import os
+import struct
+import sys
+import time
+import zlib
+from array import array
+
+import bitboard
+import symmetry
+
+PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                    "tictactoe.book")
+
+MAGIC = b"TTTBOOK\0"
+VERSION = 2
+
+# Magic, version, entry count and CRC-32 of the entries
+HEADER = struct.Struct("<8sHII")
+
+
+def main():
+    path = sys.argv[1] if len(sys.argv) > 1 else PATH
+    start = time.perf_counter()
+    moves = solve()
+    solved = time.perf_counter() - start
+    save(moves, path)
+    print(f"Solved {len(moves)} positions in {solved:.3f}s")
+    print(f"Wrote {path}: {os.path.getsize(path)} bytes")
+
+
+def solve():
+    """
+    Returns {key: cell} with the minimax move of the canonical form of
+    every reachable position that is not over.
+    """
+    import tictactoe
+
+    moves = {}
+    stack = [bitboard.Board()]
+    while stack:
+        board, _ = symmetry.canonical(stack.pop())
+        key = board.x << 9 | board.o
+        if key in moves or bitboard.terminal(board):
+            continue
+        i, j = tictactoe.minimax(board, book=False)
+        moves[key] = 3 * i + j
+        stack.extend(bitboard.result(board, action)
+                     for action in bitboard.actions(board))
+    return moves
+
+
+def save(moves, path=PATH):
+    """
+    Writes {key: cell} to path in the book format.
+    """
+    entries = array("I", sorted(key << 4 | cell
+                                for key, cell in moves.items()))
+    if sys.byteorder != "little":
+        entries.byteswap()
+    body = entries.tobytes()
+    with open(path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION, len(entries), zlib.crc32(body)))
+        f.write(body)
+
+
+def load(path=PATH):
+    """
+    Returns {key: cell} read from a book file. Raises OSError if it
+    cannot be read and ValueError if it is not a valid book.
+    """
+    with open(path, "rb") as f:
+        data = f.read()
+    if len(data) < HEADER.size:
+        raise ValueError(f"{path}: truncated book header")
+    magic, version, count, crc = HEADER.unpack_from(data)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError(f"{path}: not a version {VERSION} book")
+    body = data[HEADER.size:]
+    if len(body) != 4 * count or zlib.crc32(body) != crc:
+        raise ValueError(f"{path}: corrupt book")
+    entries = array("I")
+    entries.frombytes(body)
+    if sys.byteorder != "little":
+        entries.byteswap()
+
+    moves = {}
+    for entry in entries:
+        key, cell = entry >> 4, entry & 0xF
+        x, o = key >> 9, key & bitboard.FULL
+        if cell > 8 or (x | o) >> cell & 1:
+            raise ValueError(f"{path}: illegal move in book")
+        moves[key] = cell
+    return moves
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,400 @@
+"""
+m,n,k-games: tic tac toe on an m x n board, won by k in a row.
+
+Grid is the board, a list of m rows of n cells like the tic tac toe
+board that also carries k and its winner. result finds the winner from
+the lines through the move just made, so no function rescans the board.
+
+Search plays these games with iterative-deepening alpha-beta under a
+time budget per move. Unfinished positions are scored by the k-cell
+windows each side could still fill, kept up to date move by move.
+"""
+
+import random
+import time
+from functools import lru_cache
+
+X = "X"
+O = "O"
+EMPTY = None
+
+# Seconds minimax may spend on a move
+MOVE_BUDGET = 1.0
+
+# Positions searched between clock checks
+CLOCK_INTERVAL = 256
+
+# Boards with more cells than this only consider moves next to a mark
+NEIGHBORHOOD_CELLS = 25
+
+# Scores above WIN_BOUND are wins, WIN less the plies taken to win
+WIN = 1 << 30
+WIN_BOUND = WIN - 1000
+
+# Lines through a cell go right, down, down-right and down-left
+DIRECTIONS = [(0, 1), (1, 0), (1, 1), (1, -1)]
+
+# Transposition table flags, as in tictactoe
+EXACT, LOWER, UPPER = 0, 1, 2
+
+_UNKNOWN = object()
+
+
+class Grid(list):
+    """
+    Board of any size as a list of rows, with its win length k and its
+    winner (None while there is none). Boards are changed through result
+    only, which keeps the winner current.
+    """
+
+    def __init__(self, rows, k, winner=_UNKNOWN):
+        super().__init__(rows)
+        self.k = k
+        self.won = scan(self) if winner is _UNKNOWN else winner
+
+    def __repr__(self):
+        return f"Grid({list(self)!r}, k={self.k})"
+
+
+def initial_state(m, n, k):
+    """
+    Returns an empty m x n board won by k in a row.
+    """
+    if m < 1 or n < 1 or not 1 <= k <= max(m, n):
+        raise ValueError(f"no {k} in a row fits on a {m}x{n} board")
+    return Grid([[EMPTY] * n for _ in range(m)], k, None)
+
+
+def player(board):
+    empty = sum(row.count(EMPTY) for row in board)
+    return X if (len(board) * len(board[0]) - empty) % 2 == 0 else O
+
+
+def actions(board):
+    return {(i, j) for i, row in enumerate(board)
+            for j, cell in enumerate(row) if cell == EMPTY}
+
+
+def result(board, action):
+    i, j = action
+    if board[i][j] != EMPTY:
+        raise NameError('valid action!')
+    rows = [row.copy() for row in board]
+    rows[i][j] = player(board)
+    grid = Grid(rows, board.k, board.won)
+    if grid.won is None:
+        grid.won = winner_at(grid, action)
+    return grid
+
+
+def winner(board):
+    return board.won
+
+
+def winner_at(board, action):
+    """
+    Returns the player with k in a row through the cell `action`, if
+    any, looking only along the 4 lines through it. Boards without a
+    k of their own are won by 3 in a row.
+    """
+    i, j = action
+    mark = board[i][j]
+    if mark == EMPTY:
+        return None
+    m, n, k = len(board), len(board[0]), getattr(board, "k", 3)
+    for di, dj in DIRECTIONS:
+        count = 1
+        for sign in (1, -1):
+            r, c = i + sign * di, j + sign * dj
+            while 0 <= r < m and 0 <= c < n and board[r][c] == mark:
+                count += 1
+                r, c = r + sign * di, c + sign * dj
+        if count >= k:
+            return mark
+    return None
+
+
+def scan(board):
+    """
+    Returns the winner of board found by checking around every mark.
+    """
+    for i, row in enumerate(board):
+        for j, cell in enumerate(row):
+            if cell != EMPTY and winner_at(board, (i, j)) is not None:
+                return cell
+    return None
+
+
+def terminal(board):
+    return board.won is not None or not any(EMPTY in row for row in board)
+
+
+def utility(board):
+    if board.won == X:
+        return 1
+    elif board.won == O:
+        return -1
+    return 0
+
+
+@lru_cache(maxsize=None)
+def geometry(m, n, k):
+    """
+    Returns (windows, through, neighbors) for an m x n board, with cells
+    as row-major indices: the cells of each line of k, the windows
+    holding each cell, and the cells adjacent to each cell.
+    """
+    windows = []
+    for i in range(m):
+        for j in range(n):
+            for di, dj in DIRECTIONS:
+                r, c = i + (k - 1) * di, j + (k - 1) * dj
+                if 0 <= r < m and 0 <= c < n:
+                    windows.append(tuple((i + s * di) * n + j + s * dj
+                                         for s in range(k)))
+    through = [[] for _ in range(m * n)]
+    for w, window in enumerate(windows):
+        for cell in window:
+            through[cell].append(w)
+    neighbors = [[r * n + c
+                  for r in range(i - 1, i + 2) for c in range(j - 1, j + 2)
+                  if 0 <= r < m and 0 <= c < n and (r, c) != (i, j)]
+                 for i in range(m) for j in range(n)]
+    return windows, through, neighbors
+
+
+@lru_cache(maxsize=None)
+def gains(k):
+    """
+    Returns GAIN with GAIN[mine][theirs] the change in a window's score
+    for a side that adds a mark to it, holding `mine` marks against the
+    opponent's `theirs`.
+    """
+    weight = [0] + [10 ** c for c in range(1, k + 1)]
+
+    def value(mine, theirs):
+        if mine and theirs:
+            return 0
+        return weight[mine] if not theirs else -weight[theirs]
+
+    return [[(weight[mine + 1] if not theirs else 0) - value(mine, theirs)
+             for theirs in range(k + 1)] for mine in range(k)]
+
+
+class Timeout(Exception):
+    pass
+
+
+def last_depth(cells, max_depth):
+    """
+    Returns the deepest iteration worth searching from `cells`.
+    """
+    empties = cells.count(0)
+    return empties if max_depth is None else min(empties, max_depth)
+
+
+class Search():
+    """
+    Alpha-beta searcher for one position. Sides are 1 for X and 2 for O;
+    `score` is the window evaluation from X's point of view.
+    """
+
+    def __init__(self, board):
+        self.m, self.n, self.k = len(board), len(board[0]), board.k
+        self.windows, self.through, self.neighbors = geometry(
+            self.m, self.n, self.k)
+        self.gain = gains(self.k)
+        size = self.m * self.n
+        self.local = size > NEIGHBORHOOD_CELLS
+
+        rng = random.Random(size * 31 + self.k)
+        self.zobrist = [None] + [[rng.getrandbits(64) for _ in range(size)]
+                                 for _ in range(2)]
+        self.cells = [0] * size
+        self.near = [0] * size
+        self.counts = [None, [0] * len(self.windows),
+                       [0] * len(self.windows)]
+        self.score = 0
+        self.hash = 0
+        self.table = {}
+        self.nodes = 0
+        self.depth = 0
+        for cell, mark in enumerate(c for row in board for c in row):
+            if mark != EMPTY:
+                self.make(cell, 1 if mark == X else 2)
+
+    def run(self, budget=MOVE_BUDGET, max_depth=None):
+        """
+        Returns the best (i, j) found by searching one ply deeper at a
+        time until `budget` seconds run out, the result is proven or
+        `max_depth` plies have been searched.
+        """
+        self.deadline = time.perf_counter() + budget
+        side = self.side()
+        moves = self.ordered(side, None)
+        best = moves[0]
+        for depth in range(1, last_depth(self.cells, max_depth) + 1):
+            try:
+                value, best = self.root(side, depth, moves, best)
+            except Timeout:
+                break
+            self.depth = depth
+            moves.remove(best)
+            moves.insert(0, best)
+            if abs(value) > WIN_BOUND:
+                break
+        return divmod(best, self.n)
+
+    def side(self):
+        """
+        Returns the side to move.
+        """
+        return 1 if self.cells.count(1) == self.cells.count(2) else 2
+
+    def root(self, side, depth, moves, best):
+        alpha, beta = -WIN - 1, WIN + 1
+        for cell in moves:
+            if self.make(cell, side):
+                value = WIN - 1
+            else:
+                value = -self.negamax(3 - side, depth - 1, -beta, -alpha, 1)
+            self.unmake(cell, side)
+            if value > alpha:
+                alpha, best = value, cell
+        return alpha, best
+
+    def negamax(self, side, depth, alpha, beta, ply):
+        """
+        Returns the value for `side` to move, searched `depth` plies
+        deep, exact between alpha and beta and a bound otherwise.
+        """
+        self.nodes += 1
+        if (self.nodes % CLOCK_INTERVAL == 0
+                and time.perf_counter() > self.deadline):
+            raise Timeout
+        if depth == 0:
+            return self.score if side == 1 else -self.score
+
+        entry = self.table.get(self.hash)
+        hint = None
+        if entry is not None:
+            entry_depth, value, flag, hint = entry
+            if entry_depth >= depth:
+                # Wins are stored relative to the position they are in
+                if value > WIN_BOUND:
+                    value -= ply
+                elif value < -WIN_BOUND:
+                    value += ply
+                if flag == EXACT:
+                    return value
+                elif flag == LOWER:
+                    alpha = max(alpha, value)
+                else:
+                    beta = min(beta, value)
+                if alpha >= beta:
+                    return value
+
+        moves = self.ordered(side, hint)
+        if not moves:
+            return 0
+        original_alpha = alpha
+        best, best_move = -WIN - 1, None
+        for cell in moves:
+            if self.make(cell, side):
+                value = WIN - ply - 1
+            else:
+                value = -self.negamax(3 - side, depth - 1, -beta, -alpha,
+                                      ply + 1)
+            self.unmake(cell, side)
+            if value > best:
+                best, best_move = value, cell
+            if best > alpha:
+                alpha = best
+            if alpha >= beta:
+                break
+
+        if best <= original_alpha:
+            flag = UPPER
+        elif best >= beta:
+            flag = LOWER
+        else:
+            flag = EXACT
+        stored = best
+        if stored > WIN_BOUND:
+            stored += ply
+        elif stored < -WIN_BOUND:
+            stored -= ply
+        self.table[self.hash] = (depth, stored, flag, best_move)
+        return best
+
+    def ordered(self, side, hint):
+        """
+        Returns the cells `side` may play, `hint` first and the rest by
+        how much they add to its windows and take from the opponent's.
+        """
+        cells = self.cells
+        if self.local:
+            moves = [c for c in range(len(cells))
+                     if not cells[c] and self.near[c]]
+            if not moves:
+                moves = [c for c in range(len(cells)) if not cells[c]]
+                if len(moves) == len(cells):
+                    # Open in the centre
+                    return [(self.m // 2) * self.n + self.n // 2]
+        else:
+            moves = [c for c in range(len(cells)) if not cells[c]]
+
+        gain, through = self.gain, self.through
+        mine, theirs = self.counts[side], self.counts[3 - side]
+        k = self.k
+
+        def priority(cell):
+            total = 0
+            for w in through[cell]:
+                a, b = mine[w], theirs[w]
+                if a < k:
+                    total += gain[a][b]
+                if b < k:
+                    total += gain[b][a]
+            return -total
+
+        moves.sort(key=priority)
+        if hint is not None and hint in moves:
+            moves.remove(hint)
+            moves.insert(0, hint)
+        return moves
+
+    def make(self, cell, side):
+        """
+        Plays `side` at cell and returns whether that won.
+        """
+        self.cells[cell] = side
+        self.hash ^= self.zobrist[side][cell]
+        for neighbor in self.neighbors[cell]:
+            self.near[neighbor] += 1
+        mine, theirs = self.counts[side], self.counts[3 - side]
+        gain, k = self.gain, self.k
+        delta = 0
+        won = False
+        for w in self.through[cell]:
+            count = mine[w]
+            delta += gain[count][theirs[w]]
+            mine[w] = count + 1
+            if count + 1 == k:
+                won = True
+        self.score += delta if side == 1 else -delta
+        return won
+
+    def unmake(self, cell, side):
+        self.cells[cell] = 0
+        self.hash ^= self.zobrist[side][cell]
+        for neighbor in self.neighbors[cell]:
+            self.near[neighbor] -= 1
+        mine, theirs = self.counts[side], self.counts[3 - side]
+        gain = self.gain
+        delta = 0
+        for w in self.through[cell]:
+            count = mine[w] - 1
+            mine[w] = count
+            delta += gain[count][theirs[w]]
+        self.score -= delta if side == 1 else -delta
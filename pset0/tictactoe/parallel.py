@@ -0,0 +1,123 @@
+"""
+Root-split parallel search for the m,n,k engine.
+
+Each iteration of the iterative deepening hands the root moves to a
+pool of worker processes. Workers search their move with alpha taken
+from a shared (score, move index) pair, which each of them updates once
+its move is searched, and which gives the iteration's result. Searching
+with alpha one below the shared best keeps ties exact, and ties go to
+the earlier move, so at a fixed depth the move chosen is the one the
+serial Search.run picks.
+"""
+
+import multiprocessing
+import time
+
+import mnk
+
+# Shared aggregator and cached searcher of each worker process
+_worker = {}
+
+
+class ParallelSearch():
+    """
+    Pool of `workers` processes searching Grid positions. Use as a
+    context manager, or call close() to release the pool.
+    """
+
+    def __init__(self, workers):
+        self.workers = workers
+        # Best score and the index of its move in the current iteration
+        self.best = multiprocessing.Array("q", 2)
+        self.stats = {"nodes": 0, "depth": 0}
+        self.pool = multiprocessing.Pool(
+            workers, initializer=_attach, initargs=(self.best,))
+
+    def run(self, board, budget=mnk.MOVE_BUDGET, max_depth=None):
+        """
+        Returns the best (i, j) on board found within `budget` seconds
+        and at most `max_depth` plies, like mnk.Search.run.
+        """
+        deadline = time.time() + budget
+        search = mnk.Search(board)
+        side = search.side()
+        moves = search.ordered(side, None)
+        best = moves[0]
+        cells = tuple(search.cells)
+        self.stats.update(nodes=0, depth=0)
+
+        for depth in range(1, mnk.last_depth(search.cells, max_depth) + 1):
+            with self.best.get_lock():
+                self.best[0], self.best[1] = -mnk.WIN - 1, len(moves)
+            tasks = [(cells, search.n, search.k, index, move, depth,
+                      deadline) for index, move in enumerate(moves)]
+            results = self.pool.map(_search_move, tasks, chunksize=1)
+            self.stats["nodes"] += sum(nodes for _, nodes in results)
+            if any(value is None for value, _ in results):
+                break
+            value, index = self.best[0], self.best[1]
+            best = moves[index]
+            self.stats["depth"] = depth
+            moves.remove(best)
+            moves.insert(0, best)
+            if abs(value) > mnk.WIN_BOUND:
+                break
+        return divmod(best, search.n)
+
+    def close(self):
+        self.pool.terminate()
+        self.pool.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _attach(best):
+    _worker["best"] = best
+
+
+def _searcher(cells, n, k):
+    """
+    Returns this worker's Search of the root `cells`, reused across the
+    iterations of one move so its transposition table carries over.
+    """
+    if _worker.get("root") != (cells, n, k):
+        rows = [[mnk.EMPTY if cell == 0 else mnk.X if cell == 1 else mnk.O
+                 for cell in cells[i:i + n]]
+                for i in range(0, len(cells), n)]
+        _worker["search"] = mnk.Search(mnk.Grid(rows, k, None))
+        _worker["root"] = (cells, n, k)
+    return _worker["search"]
+
+
+def _search_move(task):
+    """
+    Searches one root move `depth` plies deep and records it in the
+    shared best. Returns (value, nodes), with value None on timeout.
+    """
+    cells, n, k, index, move, depth, deadline = task
+    search = _searcher(cells, n, k)
+    search.deadline = time.perf_counter() + deadline - time.time()
+    best = _worker["best"]
+    alpha = best[0]
+    side = search.side()
+    start = search.nodes
+    try:
+        if search.make(move, side):
+            value = mnk.WIN - 1
+        else:
+            value = -search.negamax(3 - side, depth - 1, -mnk.WIN - 1,
+                                    -(alpha - 1), 1)
+    except mnk.Timeout:
+        # The searcher was left mid-move; build a fresh one next time
+        del _worker["root"]
+        return None, search.nodes - start
+    search.unmake(move, side)
+
+    with best.get_lock():
+        if value > best[0] or (value == best[0] and index < best[1]):
+            best[0], best[1] = value, index
+    return value, search.nodes - start
@@ -17,8 +17,11 @@ mediumFont = pygame.font.Font("OpenSans-Regular.ttf", 28)
 largeFont = pygame.font.Font("OpenSans-Regular.ttf", 40)
 moveFont = pygame.font.Font("OpenSans-Regular.ttf", 60)
 
+# Play on bitboards instead of lists with: python runner.py --bitboard
+compact = "--bitboard" in sys.argv[1:]
+
 user = None
-board = ttt.initial_state()
+board = ttt.initial_state(compact)
 ai_turn = False
 
 while True:
@@ -140,7 +143,7 @@ while True:
                 if againButton.collidepoint(mouse):
                     time.sleep(0.2)
                     user = None
-                    board = ttt.initial_state()
+                    board = ttt.initial_state(compact)
                     ai_turn = False
 
     pygame.display.flip()
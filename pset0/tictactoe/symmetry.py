@@ -0,0 +1,79 @@
+"""
+Symmetries of the tic tac toe board.
+
+The 3x3 board looks the same under 4 rotations and 4 reflections, so
+every position has up to 8 equivalent forms that share a value and,
+moved back through the symmetry, a best move. canonical maps a position
+to the form with the smallest key (x << 9 | o on bitboards) and reports
+the symmetry used, so searches, caches and the opening book can keep
+one entry per class.
+"""
+
+import bitboard
+from bitboard import Board
+
+# Each symmetry as a permutation: cell c of the transformed board holds
+# the original board's cell SYMMETRIES[s][c], with cells row-major 0..8
+SYMMETRIES = [
+    (0, 1, 2, 3, 4, 5, 6, 7, 8), (6, 3, 0, 7, 4, 1, 8, 5, 2),
+    (8, 7, 6, 5, 4, 3, 2, 1, 0), (2, 5, 8, 1, 4, 7, 0, 3, 6),
+    (2, 1, 0, 5, 4, 3, 8, 7, 6), (6, 7, 8, 3, 4, 5, 0, 1, 2),
+    (0, 3, 6, 1, 4, 7, 2, 5, 8), (8, 5, 2, 7, 4, 1, 6, 3, 0),
+]
+
+# INVERSE[s][c] is the cell of the transformed board holding cell c
+INVERSE = [tuple(perm.index(cell) for cell in range(9))
+           for perm in SYMMETRIES]
+
+# MASKS[s][mask] is the image of a 9-bit mask under symmetry s
+MASKS = [[sum(1 << cell for cell in range(9) if mask >> perm[cell] & 1)
+          for mask in range(bitboard.FULL + 1)]
+         for perm in SYMMETRIES]
+
+
+def canonical(board):
+    """
+    Returns (canonical, s): the smallest equivalent of board, of the
+    same type (list or Board), and the index of the symmetry that maps
+    board to it.
+    """
+    compact = board if isinstance(board, Board) else bitboard.encode(board)
+    key, s = canonical_key(compact.x, compact.o)
+    result = Board(key >> 9, key & bitboard.FULL)
+    if isinstance(board, Board):
+        return result, s
+    return bitboard.decode(result), s
+
+
+def canonical_key(x, o):
+    """
+    Returns (key, s): the smallest x << 9 | o over the symmetries of the
+    position with masks x and o, and the symmetry giving it.
+    """
+    return min((table[x] << 9 | table[o], s)
+               for s, table in enumerate(MASKS))
+
+
+def key(x, o):
+    """
+    Returns the canonical key of the position with masks x and o.
+    """
+    return min(table[x] << 9 | table[o] for table in MASKS)
+
+
+def to_canonical(action, s):
+    """
+    Returns where the move `action` on a board lands on its image under
+    symmetry s.
+    """
+    i, j = action
+    return divmod(INVERSE[s][3 * i + j], 3)
+
+
+def from_canonical(action, s):
+    """
+    Returns the move on the original board matching `action` on its
+    image under symmetry s.
+    """
+    i, j = action
+    return divmod(SYMMETRIES[s][3 * i + j], 3)
@@ -3,16 +3,69 @@ Tic Tac Toe Player
 """
 
 import math
+import random
+import time
+from functools import lru_cache
+
+import bitboard
+import mnk
+import symmetry as symmetries
+from bitboard import Board
+from mnk import Grid
 
 X = "X"
 O = "O"
 EMPTY = None
 
+# Transposition table flags: the stored value is exact, or only a lower
+# or upper bound because the search that produced it was cut off
+EXACT, LOWER, UPPER = 0, 1, 2
+
+# Moves are tried center first, then corners, then edges
+MOVE_ORDER = [(1, 1), (0, 0), (0, 2), (2, 0), (2, 2),
+              (0, 1), (1, 0), (1, 2), (2, 1)]
+
+# MOVE_ORDER as (bitboard bit, action) pairs
+_ORDER_BITS = [(1 << (3 * i + j), (i, j)) for i, j in MOVE_ORDER]
+
+# Transposition tables kept across calls, with and without symmetry
+_tables = {True: {}, False: {}}
+
+# Opening book moves by canonical bitboard key, loaded on first use;
+# empty if the book file is missing or corrupt
+_book = None
+
+# Playouts mcts runs per move when given no budget
+MCTS_PLAYOUTS = 2000
+
+# UCT exploration weight
+UCT_C = math.sqrt(2)
 
-def initial_state():
+# Root and lines of the last mcts tree, searched for the next position
+# to reuse it
+_mcts_tree = None
+_mcts_rng = random.Random()
+
+# Root-split process pool for Grid searches, set by enable_parallel
+parallel_search = None
+
+# Filled in by minimax: positions searched by the last call
+search_stats = {"nodes": 0}
+
+
+def initial_state(compact=False, m=3, n=3, k=3):
     """
-    Returns starting state of the board.
+    Returns starting state of the board, as a bitboard if `compact`.
+
+    Other sizes give an m x n Grid won by k in a row, which every
+    function here accepts; bitboards are 3x3 only.
     """
+    if (m, n, k) != (3, 3, 3):
+        if compact:
+            raise ValueError("bitboards are 3x3 with 3 in a row only")
+        return mnk.initial_state(m, n, k)
+    if compact:
+        return Board()
     return [[EMPTY, EMPTY, EMPTY],
             [EMPTY, EMPTY, EMPTY],
             [EMPTY, EMPTY, EMPTY]]
@@ -22,6 +75,10 @@ def player(board):
     """
     Returns player who has the next turn on a board.
     """
+    if isinstance(board, Board):
+        return bitboard.player(board)
+    if isinstance(board, Grid):
+        return mnk.player(board)
     count_=0
     for i in range(3):
         for j in range(3):
@@ -38,6 +95,10 @@ def actions(board):
     """
     Returns set of all possible actions (i, j) available on the board.
     """
+    if isinstance(board, Board):
+        return bitboard.actions(board)
+    if isinstance(board, Grid):
+        return mnk.actions(board)
     possible_actions=set()
     for i in range(3):
         for j in range(3):
@@ -51,6 +112,10 @@ def result(board, action):
     """
     Returns the board that results from making move (i, j) on the board.
     """
+    if isinstance(board, Board):
+        return bitboard.result(board, action)
+    if isinstance(board, Grid):
+        return mnk.result(board, action)
     nowplayer=player(board)
     nboard=initial_state()
     for i in range(3):
@@ -67,21 +132,39 @@ def winner(board):
     """
     Returns the winner of the game, if there is one.
     """
+    if isinstance(board, Board):
+        return bitboard.winner(board)
+    if isinstance(board, Grid):
+        return mnk.winner(board)
     for i in range(3):
-        if board[i][0]==board[i][1]==board[i][2]:
+        if board[i][0]!=EMPTY and board[i][0]==board[i][1]==board[i][2]:
             return board[i][0]
-        elif board[0][i]==board[1][i]==board[2][i]:
+        elif board[0][i]!=EMPTY and board[0][i]==board[1][i]==board[2][i]:
             return board[0][i]
-    if board[0][0]==board[1][1]==board[2][2] or board[0][2]==board[1][1]==board[2][0]:
+    if board[1][1]!=EMPTY and (board[0][0]==board[1][1]==board[2][2] or board[0][2]==board[1][1]==board[2][0]):
         return board[1][1]
     return None
     raise NotImplementedError
 
 
+def winner_at(board, action):
+    """
+    Returns the winner if the move just made at `action` won the game,
+    checking only the lines through it.
+    """
+    if isinstance(board, Board):
+        return bitboard.winner(board)
+    return mnk.winner_at(board, action)
+
+
 def terminal(board):
     """
     Returns True if game is over, False otherwise.
     """
+    if isinstance(board, Board):
+        return bitboard.terminal(board)
+    if isinstance(board, Grid):
+        return mnk.terminal(board)
     if winner(board):
         return True
     for i in range(3):
@@ -96,6 +179,10 @@ def utility(board):
     """
     Returns 1 if X has won the game, -1 if O has won, 0 otherwise.
     """
+    if isinstance(board, Board):
+        return bitboard.utility(board)
+    if isinstance(board, Grid):
+        return mnk.utility(board)
     if winner(board)==X:
         return 1
     elif winner(board)==O:
@@ -105,9 +192,353 @@ def utility(board):
     raise NotImplementedError
 
 
-def minimax(board):
+def minimax(board, symmetry=True, book=True, budget=mnk.MOVE_BUDGET,
+            depth=None):
     """
     Returns the optimal action for the current player on the board.
+
+    With `book`, the move is looked up in the opening book written by
+    book.py. Otherwise, or if the book is unusable, searches the game
+    tree with alpha-beta pruning and a transposition table, on
+    bitboards; with `symmetry`, positions are keyed by their canonical
+    form (see symmetry.py) so equivalent positions share entries. Wins
+    score higher the sooner they come.
+
+    On a Grid, returns the best action the mnk engine finds within
+    `budget` seconds and `depth` plies instead, searching root moves in
+    parallel once enable_parallel has been called.
+    """
+    if terminal(board):
+        return None
+    if isinstance(board, Grid):
+        if parallel_search is not None:
+            action = parallel_search.run(board, budget, depth)
+            search_stats.update(parallel_search.stats)
+            return action
+        search = mnk.Search(board)
+        action = search.run(budget, depth)
+        search_stats.update(nodes=search.nodes, depth=search.depth)
+        return action
+    if not isinstance(board, Board):
+        board = bitboard.encode(board)
+    search_stats["nodes"] = 0
+    if book:
+        key, s = symmetries.canonical_key(board.x, board.o)
+        cell = _load_book().get(key)
+        if cell is not None:
+            return symmetries.from_canonical(divmod(cell, 3), s)
+    table = _tables[symmetry]
+    if bitboard.player(board) == X:
+        me, opp = board.x, board.o
+    else:
+        me, opp = board.o, board.x
+    best_move, alpha = None, -math.inf
+    seen = set()
+    for bit, action in _ORDER_BITS:
+        if (me | opp) & bit:
+            continue
+        if symmetry:
+            # Moves leading to symmetric positions are equally good
+            key = _key(opp, me | bit, True)
+            if key in seen:
+                continue
+            seen.add(key)
+        value = -_negamax(opp, me | bit, -math.inf, -alpha, table, symmetry)
+        if value > alpha:
+            best_move, alpha = action, value
+    return best_move
+
+
+def enable_parallel(workers):
+    """
+    Starts a pool of `workers` processes that minimax splits the root
+    moves of Grid searches across, or stops it if workers is None.
+    Returns the ParallelSearch; close it when done.
+    """
+    global parallel_search
+    from parallel import ParallelSearch
+
+    if parallel_search is not None:
+        parallel_search.close()
+        parallel_search = None
+    if workers is not None:
+        parallel_search = ParallelSearch(workers)
+    return parallel_search
+
+
+def clear_cache():
+    """
+    Empties the transposition tables minimax keeps between calls.
+    """
+    for table in _tables.values():
+        table.clear()
+
+
+def _load_book():
+    global _book
+    if _book is None:
+        import book
+        try:
+            _book = book.load()
+        except (OSError, ValueError):
+            _book = {}
+    return _book
+
+
+def _negamax(me, opp, alpha, beta, table, symmetry):
+    """
+    Returns the value for the player to move, whose marks are the mask
+    `me`, exact if it lies strictly between alpha and beta and otherwise
+    a bound on that side.
+    """
+    search_stats["nodes"] += 1
+    key = _key(me, opp, symmetry)
+    entry = table.get(key)
+    if entry is not None:
+        value, flag = entry
+        if flag == EXACT:
+            return value
+        elif flag == LOWER:
+            alpha = max(alpha, value)
+        else:
+            beta = min(beta, value)
+        if alpha >= beta:
+            return value
+
+    taken = me | opp
+    empties = 9 - taken.bit_count()
+    if bitboard.WON[opp]:
+        # The previous player just won
+        return -(1 + empties)
+    if not empties:
+        return 0
+
+    original_alpha = alpha
+    best = -math.inf
+    for bit, _ in _ORDER_BITS:
+        if taken & bit:
+            continue
+        value = -_negamax(opp, me | bit, -beta, -alpha, table, symmetry)
+        if value > best:
+            best = value
+        if best > alpha:
+            alpha = best
+        if alpha >= beta:
+            break
+
+    if best <= original_alpha:
+        flag = UPPER
+    elif best >= beta:
+        flag = LOWER
+    else:
+        flag = EXACT
+    table[key] = (best, flag)
+    return best
+
+
+def _key(me, opp, symmetry):
+    """
+    Returns an integer identifying the position, the same for all 8 of
+    its symmetries when `symmetry` is set.
+    """
+    if not symmetry:
+        return me << 9 | opp
+    return symmetries.key(me, opp)
+
+
+def mcts(board, playouts=None, budget=None, reuse=True, seed=None):
+    """
+    Returns (action, visits) for the current player on the board, found
+    by Monte Carlo tree search: `visits` maps each action tried at the
+    root to (visits, mean reward), rewards being 1 for a win and 1/2 for
+    a draw, and action is the most visited.
+
+    Runs `playouts` random games, or as many as fit in `budget` seconds,
+    or MCTS_PLAYOUTS if neither is given; always at least one, so that
+    there is a move to return. With `reuse`, the subtree for
+    board is kept from the tree of the previous call, if board follows
+    that call's position by up to two moves.
+    """
+    global _mcts_tree
+    if terminal(board):
+        return None, {}
+    if seed is not None:
+        _mcts_rng.seed(seed)
+    if playouts is None and budget is None:
+        playouts = MCTS_PLAYOUTS
+    m, n = len(board), len(board[0])
+    k = board.k if isinstance(board, Grid) else 3
+    lines = _lines(m, n, k)
+    x, o = _masks(board, n)
+
+    root = _reused(x, o, lines) if reuse else None
+    reused = 0 if root is None else root.visits
+    if root is None:
+        root = _Node(None, None, x, o, lines, _mcts_rng)
+    root.parent = None
+    _mcts_tree = (root, lines)
+
+    deadline = None if budget is None else time.perf_counter() + budget
+    done = 0
+    while True:
+        _mcts_iteration(root, lines)
+        done += 1
+        if ((playouts is not None and done >= playouts)
+                or (deadline is not None
+                    and time.perf_counter() >= deadline)):
+            break
+
+    search_stats.update(playouts=done, reused=reused)
+    visits = {divmod(child.move, n): (child.visits,
+                                      child.reward / child.visits)
+              for child in root.children}
+    best = max(root.children, key=lambda child: child.visits)
+    return divmod(best.move, n), visits
+
+
+class _Node():
+    """
+    MCTS tree node: the position after `move`, as masks x and o, with
+    the reward totalled for the player who made that move.
+    """
+
+    __slots__ = ("move", "parent", "x", "o", "children", "untried",
+                 "visits", "reward", "won", "x_to_move")
+
+    def __init__(self, move, parent, x, o, lines, rng):
+        self.move = move
+        self.parent = parent
+        self.x = x
+        self.o = o
+        self.children = []
+        self.visits = 0
+        self.reward = 0.0
+        self.x_to_move = x.bit_count() == o.bit_count()
+        if move is None:
+            self.won = any(_wins(mask, lines) for mask in (x, o))
+        else:
+            mover = o if self.x_to_move else x
+            self.won = any(line & mover == line for line in lines[move])
+        if self.won:
+            self.untried = []
+        else:
+            taken = x | o
+            self.untried = [cell for cell in range(len(lines))
+                            if not taken >> cell & 1]
+            rng.shuffle(self.untried)
+
+
+def _mcts_iteration(root, lines):
+    """
+    Selects a leaf of the tree by UCT, expands one move there, finishes
+    the game at random and credits every node on the way.
+    """
+    node = root
+    while not node.untried and node.children:
+        log_visits = math.log(node.visits)
+        node = max(node.children, key=lambda child: (
+            child.reward / child.visits
+            + UCT_C * math.sqrt(log_visits / child.visits)))
+
+    if node.untried:
+        cell = node.untried.pop()
+        bit = 1 << cell
+        if node.x_to_move:
+            child = _Node(cell, node, node.x | bit, node.o, lines, _mcts_rng)
+        else:
+            child = _Node(cell, node, node.x, node.o | bit, lines, _mcts_rng)
+        node.children.append(child)
+        node = child
+
+    if node.won:
+        winner = O if node.x_to_move else X
+    else:
+        winner = _playout(node.x, node.o, node.x_to_move, lines)
+
+    while node is not None:
+        node.visits += 1
+        if winner is None:
+            node.reward += 0.5
+        elif (winner == X) != node.x_to_move:
+            # The player who moved into node won
+            node.reward += 1
+        node = node.parent
+
+
+def _playout(x, o, x_to_move, lines):
+    """
+    Plays random moves from masks x and o to the end of the game and
+    returns the winner, or None for a draw.
+    """
+    taken = x | o
+    cells = [cell for cell in range(len(lines)) if not taken >> cell & 1]
+    _mcts_rng.shuffle(cells)
+    for cell in cells:
+        if x_to_move:
+            x |= 1 << cell
+            mine = x
+        else:
+            o |= 1 << cell
+            mine = o
+        for line in lines[cell]:
+            if line & mine == line:
+                return X if x_to_move else O
+        x_to_move = not x_to_move
+    return None
+
+
+def _reused(x, o, lines):
+    """
+    Returns the node of the previous mcts tree for masks x and o, at
+    most two moves below its root, or None.
+    """
+    if _mcts_tree is None or _mcts_tree[1] is not lines:
+        return None
+    level = [_mcts_tree[0]]
+    for _ in range(3):
+        for node in level:
+            if node.x == x and node.o == o:
+                return node
+        level = [child for node in level for child in node.children]
+    return None
+
+
+@lru_cache(maxsize=None)
+def _lines(m, n, k):
+    """
+    Returns, for each cell of an m x n board, the bit masks of the lines
+    of k through it.
+    """
+    windows, through, _ = mnk.geometry(m, n, k)
+    masks = [sum(1 << cell for cell in window) for window in windows]
+    return [[masks[w] for w in through[cell]] for cell in range(m * n)]
+
+
+def _wins(mask, lines):
+    return any(line & mask == line for cell_lines in lines
+               for line in cell_lines)
+
+
+def _masks(board, n):
+    """
+    Returns the x and o masks of board, with cell (i, j) at bit i * n + j.
+    """
+    if isinstance(board, Board):
+        return board.x, board.o
+    x = o = 0
+    for i, row in enumerate(board):
+        for j, cell in enumerate(row):
+            if cell == X:
+                x |= 1 << (i * n + j)
+            elif cell == O:
+                o |= 1 << (i * n + j)
+    return x, o
+
+
+def minimax_sumv(board):
+    """
+    Original heuristic player, kept for comparison: scores each move by
+    the average utility of every game that can follow it.
     """
     """
     def maxv(board,V=20):
@@ -141,6 +572,7 @@ def minimax(board):
         if temp_>0:
             w/=len(actionsSet)
         sum_=0
+        search_stats["nodes"]+=1
         for action in actionsSet:
             temp_b=result(board,action)
             if terminal(temp_b):
@@ -149,6 +581,7 @@ def minimax(board):
                 sum_+=sumv(temp_b,w)
         return sum_
     ############################################
+    search_stats["nodes"]=0
     if terminal(board):
         return None
     elif board[1][1]==EMPTY:
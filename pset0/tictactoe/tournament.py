@@ -0,0 +1,207 @@
+"""
+Headless self-play tournaments between tictactoe engines.
+
+Usage: python tournament.py ENGINE ENGINE [--games N] [--processes P]
+                            [--size M,N,K] [--seed S]
+
+An engine is any function taking a board and returning an action, like
+tictactoe.minimax, named "module:function" or by one of the ENGINES
+shortcuts, which may name players defined here. The engines swap sides
+every game. Games run concurrently across a process pool; the report
+gives games per second, W/D/L for the first engine, and a latency
+histogram for each.
+"""
+
+import argparse
+import importlib
+import multiprocessing
+import random
+import sys
+import time
+from collections import Counter
+
+import tictactoe as ttt
+
+ENGINES = {
+    "minimax": "tictactoe:minimax",
+    "search": "search_player",
+    "mcts": "mcts_player",
+    "sumv": "tictactoe:minimax_sumv",
+    "random": "random_player",
+}
+
+# Histogram buckets double from this many microseconds
+FIRST_BUCKET_US = 1
+
+# Randomness of random_player, seeded at the start of every game
+_rng = random.Random()
+
+# Engines loaded by each worker process, by spec
+_engines = {}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("engines", nargs=2, metavar="ENGINE",
+                        help="module:function or one of "
+                        + ", ".join(ENGINES))
+    parser.add_argument("--games", type=int, default=1000)
+    parser.add_argument("--processes", type=int,
+                        default=multiprocessing.cpu_count())
+    parser.add_argument("--size", default="3,3,3",
+                        help="rows, columns and win length")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    size = tuple(int(value) for value in args.size.split(","))
+    if len(size) != 3:
+        sys.exit("--size takes M,N,K")
+    for spec in args.engines:
+        load_engine(spec)
+    start = time.perf_counter()
+    games = run(args.engines, args.games, size, args.processes, args.seed)
+    report(args.engines, games, time.perf_counter() - start)
+
+
+def load_engine(spec):
+    """
+    Returns the function named by `spec`, "module:function" or a key
+    of ENGINES.
+    """
+    spec = ENGINES.get(spec, spec)
+    if spec not in _engines:
+        module, sep, name = spec.partition(":")
+        if sep:
+            _engines[spec] = getattr(importlib.import_module(module), name)
+        elif spec in ENGINES.values():
+            # Players defined here share this module's seeded _rng
+            _engines[spec] = globals()[spec]
+        else:
+            raise ValueError(f"engine {spec!r} is not module:function")
+    return _engines[spec]
+
+
+def random_player(board):
+    """
+    Plays a uniformly random legal move.
+    """
+    return _rng.choice(sorted(ttt.actions(board)))
+
+
+def search_player(board):
+    """
+    Plays minimax without the opening book.
+    """
+    return ttt.minimax(board, book=False)
+
+
+def mcts_player(board):
+    """
+    Plays the most visited move of MCTS_PLAYOUTS playouts, seeded like
+    random_player.
+    """
+    return ttt.mcts(board, seed=_rng.getrandbits(32))[0]
+
+
+def run(engines, games, size, processes, seed=0):
+    """
+    Plays `games` games between the two engines, the first taking X in
+    even games and O in odd ones, and returns their results in order.
+    """
+    tasks = [(engines, size, game, seed + game) for game in range(games)]
+    if processes <= 1:
+        return [play(task) for task in tasks]
+    chunksize = max(1, games // processes // 8)
+    with multiprocessing.Pool(processes) as pool:
+        return pool.map(play, tasks, chunksize)
+
+
+def play(task):
+    """
+    Plays one game and returns {"winner": 0, 1 or None, "plies": ...,
+    "latencies": [seconds per move of engine 0, of engine 1],
+    "forfeit": engine or None}, where engines are numbered by their
+    position in the task. An engine that returns an illegal move loses.
+    """
+    engines, (m, n, k), game, seed = task
+    _rng.seed(seed)
+    players = [load_engine(spec) for spec in engines]
+    # Engine numbers of X and O
+    order = (0, 1) if game % 2 == 0 else (1, 0)
+    board = ttt.initial_state(m=m, n=n, k=k)
+    latencies = ([], [])
+    plies = 0
+    while not ttt.terminal(board):
+        engine = order[plies % 2]
+        start = time.perf_counter()
+        action = players[engine](board)
+        latencies[engine].append(time.perf_counter() - start)
+        if action not in ttt.actions(board):
+            return {"winner": 1 - engine, "plies": plies,
+                    "latencies": latencies, "forfeit": engine}
+        board = ttt.result(board, action)
+        plies += 1
+
+    mark = ttt.winner(board)
+    winner = None if mark is None else order[0 if mark == ttt.X else 1]
+    return {"winner": winner, "plies": plies,
+            "latencies": latencies, "forfeit": None}
+
+
+def histogram(latencies):
+    """
+    Returns [(upper bound in microseconds, count)] over buckets that
+    double in width, from the fastest move to the slowest.
+    """
+    counts = Counter()
+    for seconds in latencies:
+        bound = FIRST_BUCKET_US
+        while bound < seconds * 1e6:
+            bound *= 2
+        counts[bound] += 1
+    if not counts:
+        return []
+    buckets = []
+    bound = min(counts)
+    while bound <= max(counts):
+        buckets.append((bound, counts[bound]))
+        bound *= 2
+    return buckets
+
+
+def report(engines, games, seconds, file=sys.stdout):
+    """
+    Prints throughput, results for the first engine and each engine's
+    latency histogram.
+    """
+    outcomes = Counter("draw" if game["winner"] is None
+                       else "win" if game["winner"] == 0 else "loss"
+                       for game in games)
+    forfeits = Counter(game["forfeit"] for game in games
+                       if game["forfeit"] is not None)
+    plies = sum(game["plies"] for game in games)
+    print(f"{len(games)} games, {plies} moves in {seconds:.2f}s: "
+          f"{len(games) / seconds:.1f} games/s", file=file)
+    print(f"{engines[0]} vs {engines[1]}: {outcomes['win']} W / "
+          f"{outcomes['draw']} D / {outcomes['loss']} L", file=file)
+    for engine, spec in enumerate(engines):
+        if forfeits[engine]:
+            print(f"{spec} forfeited {forfeits[engine]} games by "
+                  "illegal moves", file=file)
+
+    for engine, spec in enumerate(engines):
+        latencies = [latency for game in games
+                     for latency in game["latencies"][engine]]
+        if not latencies:
+            continue
+        print(f"\n{spec}: {len(latencies)} moves, mean "
+              f"{1e6 * sum(latencies) / len(latencies):.1f} us", file=file)
+        buckets = histogram(latencies)
+        widest = max(count for _, count in buckets)
+        for bound, count in buckets:
+            bar = "#" * round(40 * count / widest)
+            print(f"  <= {bound:>9} us {count:>8} {bar}", file=file)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,402 @@
+"""
+Benchmarks for logic.model_check backends on knights and knaves puzzles.
+
+Usage: python benchmark.py backends [--people N ...] [--enumerate-limit S]
+       python benchmark.py evaluate [--models N]
+       python benchmark.py truth-table [--people N ...] [--enumerate-limit S]
+       python benchmark.py structure [--size N]
+       python benchmark.py queries [--people N ...] [--enumerate-limit S]
+
+backends builds random puzzles of N people (2N symbols) in the style of
+puzzle.py: everyone is a knight or a knave, knights' statements are
+true and knaves' false. Each backend is asked, for every symbol, whether
+the knowledge entails it; the answers must agree, and must hold in the
+hidden assignment the puzzle was made from.
+
+evaluate compares Sentence.evaluate with compiled sentences, one model
+at a time and as bit-vectors, on the puzzles and on random formulas.
+
+truth-table compares the time and peak memory of the "truth_table"
+backend with the recursive "enumerate" one, query by query.
+
+structure times symbols() and hash() on knowledge bases built up with
+And.add, on deeply nested sentences and on one large puzzle.
+
+queries compares asking model_check about every symbol of a puzzle, as
+puzzle.py did, with one sat.KnowledgeBase answering them all, and with
+retracting and restoring each person's statement between rounds.
+"""
+
+import argparse
+import random
+import sys
+import time
+import tracemalloc
+
+from logic import And, Biconditional, Implication, Not, Or, Symbol
+from logic import BACKENDS, TRUTH_TABLE_LIMIT, model_check
+from sat import KnowledgeBase
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    commands = parser.add_subparsers(dest="command", required=True)
+    backends = commands.add_parser(
+        "backends", help="entailment time per backend as symbols grow")
+    backends.add_argument("--people", type=int, nargs="+",
+                          default=[3, 5, 8, 25, 50, 100, 250])
+    backends.add_argument("--enumerate-limit", type=int, default=16,
+                          help="most symbols to enumerate models for")
+    evaluate = commands.add_parser(
+        "evaluate", help="tree-walk against compiled evaluation")
+    evaluate.add_argument("--models", type=int, default=4096,
+                          help="random models per formula")
+    table = commands.add_parser(
+        "truth-table", help="bit-parallel against recursive enumeration")
+    table.add_argument("--people", type=int, nargs="+",
+                       default=[3, 4, 5, 6, 7, 8, 9, 10, 11, 12])
+    table.add_argument("--enumerate-limit", type=int, default=18,
+                       help="most symbols to enumerate models for")
+    structure = commands.add_parser(
+        "structure", help="symbols() and hash() on deep sentences")
+    structure.add_argument("--size", type=int, default=1000,
+                           help="conjuncts added and nesting depth")
+    queries = commands.add_parser(
+        "queries", help="per-symbol model_check against a KnowledgeBase")
+    queries.add_argument("--people", type=int, nargs="+",
+                         default=[3, 5, 8, 25, 50, 100, 250])
+    queries.add_argument("--enumerate-limit", type=int, default=16,
+                         help="most symbols to enumerate models for")
+    args = parser.parse_args()
+
+    # Sentence methods recurse once per nesting level
+    sys.setrecursionlimit(10000)
+    if args.command == "backends":
+        benchmark_backends(args.people, args.enumerate_limit)
+    elif args.command == "evaluate":
+        benchmark_evaluate(args.models)
+    elif args.command == "truth-table":
+        benchmark_truth_table(args.people, args.enumerate_limit)
+    elif args.command == "structure":
+        benchmark_structure(args.size)
+    elif args.command == "queries":
+        benchmark_queries(args.people, args.enumerate_limit)
+
+
+def puzzle(people, seed=0):
+    """
+    Returns (knowledge, symbols, truth) for a random puzzle: everyone's
+    Knight and Knave symbols, and the name -> value assignment that the
+    statements were made true or false under.
+    """
+    rng = random.Random(seed)
+    knights = [Symbol(f"P{i} is a Knight") for i in range(people)]
+    knaves = [Symbol(f"P{i} is a Knave") for i in range(people)]
+    truth = {}
+    for knight, knave in zip(knights, knaves):
+        truth[knight.name] = rng.random() < 0.5
+        truth[knave.name] = not truth[knight.name]
+
+    knowledge = And()
+    for i in range(people):
+        knowledge.add(Or(knights[i], knaves[i]))
+        knowledge.add(Not(And(knights[i], knaves[i])))
+    for i in range(people):
+        others = [j for j in range(people) if j != i] or [i]
+        a, b = rng.choice(others), rng.choice(others)
+        statement = rng.choice([
+            knaves[a],
+            And(knights[a], knaves[b]),
+            Or(knights[a], knights[b]),
+            Biconditional(knights[a], knights[b]),
+            Implication(knights[a], knaves[b]),
+        ])
+        if statement.evaluate(truth) != truth[knights[i].name]:
+            statement = Not(statement)
+        knowledge.add(Implication(knights[i], statement))
+        knowledge.add(Implication(knaves[i], Not(statement)))
+    return knowledge, knights + knaves, truth
+
+
+def benchmark_backends(sizes, enumerate_limit):
+    """
+    Prints the mean time of one model_check query per backend, for
+    puzzles with each number of people.
+    """
+    print(f"{'symbols':>8}{'entailed':>10}"
+          + "".join(f"{backend + ' ms':>16}" for backend in BACKENDS))
+    for people in sizes:
+        knowledge, symbols, truth = puzzle(people, seed=people)
+        answers = {}
+        times = {}
+        for backend in BACKENDS:
+            if backend == "enumerate" and len(symbols) > enumerate_limit:
+                continue
+            if backend == "truth_table" and len(symbols) > TRUTH_TABLE_LIMIT:
+                continue
+            start = time.perf_counter()
+            answers[backend] = [model_check(knowledge, symbol, backend)
+                                for symbol in symbols]
+            times[backend] = (time.perf_counter() - start) / len(symbols)
+
+        first = next(iter(answers.values()))
+        for backend, entailed in answers.items():
+            if entailed != first:
+                raise AssertionError(f"{backend} disagrees on {people}")
+        for symbol, entailed in zip(symbols, first):
+            if entailed and not truth[symbol.name]:
+                raise AssertionError(f"{symbol} entailed but false")
+        print(f"{len(symbols):>8}{sum(first):>10}" + "".join(
+            f"{1000 * times[backend]:>16.3f}" if backend in times
+            else f"{'-':>16}" for backend in BACKENDS))
+
+
+def random_formula(symbols, nodes, rng):
+    """
+    Returns a random sentence over `symbols` with about `nodes`
+    connectives.
+    """
+    if nodes <= 0:
+        symbol = rng.choice(symbols)
+        return Not(symbol) if rng.random() < 0.5 else symbol
+    kind = rng.randrange(5)
+    if kind == 0:
+        return Not(random_formula(symbols, nodes - 1, rng))
+    left = rng.randint(0, nodes - 1)
+    parts = (random_formula(symbols, left, rng),
+             random_formula(symbols, nodes - 1 - left, rng))
+    return [And, Or, Implication, Biconditional][kind - 1](*parts)
+
+
+def benchmark_evaluate(count):
+    """
+    Prints models evaluated per second by the tree walk, the compiled
+    function and the compiled bit-vector function (given models already
+    packed into columns), checking they agree.
+    """
+    import puzzle as puzzles
+
+    rng = random.Random(22)
+    cases = [(f"puzzle {i}", getattr(puzzles, f"knowledge{i}"))
+             for i in range(4)]
+    cases.append(("25 people", puzzle(25, seed=25)[0]))
+    for symbols, nodes in [(20, 200), (50, 2000), (100, 10000)]:
+        names = [Symbol(f"s{i}") for i in range(symbols)]
+        cases.append((f"random {nodes}",
+                      random_formula(names, nodes, rng)))
+
+    print(f"{'sentence':<14}{'symbols':>8}{'compile ms':>11}"
+          f"{'tree/s':>11}{'compiled/s':>12}{'bits/s':>12}")
+    for name, sentence in cases:
+        symbols = sorted(sentence.symbols())
+        models = [{symbol: rng.random() < 0.5 for symbol in symbols}
+                  for _ in range(count)]
+
+        start = time.perf_counter()
+        compiled = sentence.compile(symbols)
+        compile_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        expected = [sentence.evaluate(model) for model in models]
+        tree = time.perf_counter() - start
+
+        rows = [[model[symbol] for symbol in symbols] for model in models]
+        start = time.perf_counter()
+        single = [compiled.function(row) for row in rows]
+        function = time.perf_counter() - start
+
+        columns = [sum(1 << j for j, row in enumerate(rows) if row[i])
+                   for i in range(len(symbols))]
+        start = time.perf_counter()
+        result = compiled.evaluate_bits(columns, count)
+        bits = time.perf_counter() - start
+        batch = [bool(result >> j & 1) for j in range(count)]
+
+        if single != expected or batch != expected:
+            raise AssertionError(f"compiled {name} disagrees")
+        print(f"{name:<14}{len(symbols):>8}{1000 * compile_seconds:>11.2f}"
+              f"{count / tree:>11.0f}{count / function:>12.0f}"
+              f"{count / bits:>12.0f}")
+
+
+def benchmark_truth_table(sizes, enumerate_limit):
+    """
+    Prints the mean time of one query and the peak memory traced during
+    one query for the "truth_table" and "enumerate" backends, for
+    puzzles with each number of people, checking they agree with "cdcl".
+    """
+    backends = ["enumerate", "truth_table"]
+    print(f"{'symbols':>8}" + "".join(f"{backend + ' ms':>16}"
+                                      for backend in backends)
+          + f"{'speedup':>9}" + "".join(f"{backend + ' KiB':>17}"
+                                         for backend in backends))
+    for people in sizes:
+        knowledge, symbols, truth = puzzle(people, seed=people)
+        expected = [model_check(knowledge, symbol, "cdcl")
+                    for symbol in symbols]
+        times = {}
+        peaks = {}
+        for backend in backends:
+            if backend == "enumerate" and len(symbols) > enumerate_limit:
+                continue
+            start = time.perf_counter()
+            answers = [model_check(knowledge, symbol, backend)
+                       for symbol in symbols]
+            times[backend] = (time.perf_counter() - start) / len(symbols)
+            if answers != expected:
+                raise AssertionError(f"{backend} disagrees on {people}")
+
+            tracemalloc.start()
+            model_check(knowledge, symbols[0], backend)
+            peaks[backend] = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+
+        speedup = (f"{times['enumerate'] / times['truth_table']:>8.1f}x"
+                   if "enumerate" in times else f"{'-':>9}")
+        print(f"{len(symbols):>8}" + "".join(
+            f"{1000 * times[backend]:>16.3f}" if backend in times
+            else f"{'-':>16}" for backend in backends) + speedup + "".join(
+            f"{peaks[backend] / 1024:>17.1f}" if backend in peaks
+            else f"{'-':>17}" for backend in backends))
+
+
+def benchmark_structure(size):
+    """
+    Prints the time spent in symbols() and in hash() for:
+    a knowledge base queried after each of `size` And.add calls; two
+    knowledge bases built by alternate adds, one queried after each;
+    the first call on an And of 20 * `size` conjuncts built at once;
+    every subformula of a sentence nested `size` deep; and 100 repeated
+    calls on a 250-person puzzle.
+    """
+    print(f"{'case':<14}{'calls':>8}{'symbols ms':>12}{'hash ms':>10}")
+    names = [Symbol(f"s{i}") for i in range(size)]
+
+    def row(name, calls, sentences):
+        start = time.perf_counter()
+        for sentence in sentences():
+            sentence.symbols()
+        symbols = time.perf_counter() - start
+        start = time.perf_counter()
+        for sentence in sentences():
+            hash(sentence)
+        hashes = time.perf_counter() - start
+        print(f"{name:<14}{calls:>8}{1000 * symbols:>12.2f}"
+              f"{1000 * hashes:>10.2f}")
+
+    def incremental():
+        knowledge = And()
+        for i in range(1, size):
+            knowledge.add(Implication(names[i], Or(names[i - 1], names[i])))
+            yield knowledge
+    row("incremental", size - 1, incremental)
+
+    def interleaved():
+        knowledge, other = And(), And()
+        for i in range(1, size):
+            knowledge.add(Implication(names[i], names[i - 1]))
+            other.add(Implication(names[i - 1], names[i]))
+            yield knowledge
+    row("interleaved", size - 1, interleaved)
+
+    wide = [Symbol(f"w{i}") for i in range(20 * size)]
+    conjuncts = [Implication(wide[i], wide[i - 1])
+                 for i in range(1, len(wide))]
+    # A fresh conjunction for the symbols() pass and for the hash() pass
+    built = iter([And(*conjuncts), And(*conjuncts)])
+    row("constructor", 1, lambda: [next(built)])
+
+    nested = [names[0]]
+    for name in names[1:]:
+        nested.append(Implication(name, Not(nested[-1])))
+    row("nested", size, lambda: reversed(nested))
+
+    knowledge = puzzle(250, seed=250)[0]
+    row("250 people", 100, lambda: [knowledge] * 100)
+
+
+def benchmark_queries(sizes, enumerate_limit):
+    """
+    Prints, for puzzles with each number of people, the time to find
+    every entailed symbol: by a model_check loop with the "enumerate"
+    and "cdcl" backends, and by a KnowledgeBase through entails and
+    through entailed_symbols (times include building it). Then the mean
+    time of a round with one person's statement retracted, for up to 10
+    people in turn, by the cdcl loop over a rebuilt conjunction and by
+    a KnowledgeBase built once. Also checks that a query changed after
+    being asked is answered afresh.
+    """
+    print(f"{'symbols':>8}{'entailed':>10}{'enumerate ms':>14}"
+          f"{'cdcl ms':>10}{'kb ms':>10}{'kb bulk ms':>12}{'solves':>8}"
+          f"{'round cdcl ms':>15}{'round kb ms':>13}")
+    for people in sizes:
+        knowledge, symbols, truth = puzzle(people, seed=people)
+
+        loops = {}
+        for backend in ["enumerate", "cdcl"]:
+            if backend == "enumerate" and len(symbols) > enumerate_limit:
+                continue
+            start = time.perf_counter()
+            loops[backend] = [symbol for symbol in symbols
+                              if model_check(knowledge, symbol, backend)]
+            loops[backend + " ms"] = 1000 * (time.perf_counter() - start)
+
+        start = time.perf_counter()
+        base = KnowledgeBase(knowledge)
+        each = [symbol for symbol in symbols if base.entails(symbol)]
+        each_ms = 1000 * (time.perf_counter() - start)
+
+        start = time.perf_counter()
+        base = KnowledgeBase(knowledge)
+        bulk = base.entailed_symbols(symbols)
+        bulk_ms = 1000 * (time.perf_counter() - start)
+        solves = base.solver.stats["solves"]
+
+        answers = [each] + [loops[backend] for backend in BACKENDS
+                            if backend in loops]
+        if any(answer != bulk for answer in answers):
+            raise AssertionError(f"answers disagree on {people}")
+
+        # A query extended by And.add after being asked is compiled anew
+        query = And(*bulk)
+        asked = base.entails(query)
+        query.add(next(symbol for symbol in symbols if symbol not in bulk))
+        if not asked or base.entails(query) != model_check(
+                knowledge, query, "cdcl"):
+            raise AssertionError("stale answer for a changed query")
+
+        # The last two conjuncts of each person are their statement
+        statements = knowledge.conjuncts[2 * people:]
+        rounds = min(people, 10)
+        start = time.perf_counter()
+        expected = []
+        for i in range(rounds):
+            kept = And(*knowledge.conjuncts[:2 * people],
+                       *statements[:2 * i], *statements[2 * i + 2:])
+            expected.append([symbol for symbol in symbols
+                             if model_check(kept, symbol, "cdcl")])
+        round_loop_ms = 1000 * (time.perf_counter() - start) / rounds
+
+        start = time.perf_counter()
+        base = KnowledgeBase(*knowledge.conjuncts[:2 * people])
+        handles = [base.add(statement) for statement in statements]
+        answers = []
+        for i in range(rounds):
+            for j in (2 * i, 2 * i + 1):
+                base.retract(handles[j])
+            answers.append(base.entailed_symbols(symbols))
+            for j in (2 * i, 2 * i + 1):
+                handles[j] = base.add(statements[j])
+        round_kb_ms = 1000 * (time.perf_counter() - start) / rounds
+        if answers != expected:
+            raise AssertionError(f"retraction disagrees on {people}")
+
+        enumerate_ms = (f"{loops['enumerate ms']:>14.2f}"
+                        if "enumerate" in loops else f"{'-':>14}")
+        print(f"{len(symbols):>8}{len(bulk):>10}{enumerate_ms}"
+              f"{loops['cdcl ms']:>10.2f}{each_ms:>10.2f}{bulk_ms:>12.2f}"
+              f"{solves:>8}{round_loop_ms:>15.2f}{round_kb_ms:>13.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,22 @@
 import itertools
+import weakref
 
 
 class Sentence():
 
+    # (set of symbols, hash), filled in by _summary and dropped by
+    # And.add on every sentence built on the conjunction it extends
+    _cache = None
+    # The sentences with this one as an operand, weakly by id (equal
+    # sentences are still distinct parents), kept only for sentences
+    # that can change, i.e. contain an And
+    _parents = None
+    # Whether the sentence may contain an And
+    _mutable = True
+    # Whether changes to the sentence are reported by And.add, so its
+    # summary can be cached; not so for subclasses from outside
+    _tracked = False
+
     def evaluate(self, model):
         """Evaluates the logical sentence."""
         raise Exception("nothing to evaluate")
@@ -13,7 +27,78 @@ class Sentence():
 
     def symbols(self):
         """Returns a set of all symbols in the logical sentence."""
-        return set()
+        return set(self._summary()[0])
+
+    def _summary(self):
+        """
+        Returns (set of symbols, hash) of the sentence, computed once
+        until a conjunction inside it changes. The set is shared and
+        must not be modified.
+        """
+        cache = self._cache
+        if cache is None:
+            cache = self._summarize()
+            if self._tracked:
+                self._cache = cache
+        return cache
+
+    def _summarize(self):
+        """
+        Returns (set of symbols, hash) of the sentence from the
+        summaries of its operands.
+        """
+        if type(self).symbols is Sentence.symbols:
+            return frozenset(), object.__hash__(self)
+        # Subclasses from outside this module may only define symbols()
+        # and perhaps __hash__
+        try:
+            summary = hash(self)
+        except TypeError:
+            summary = None
+        return frozenset(self.symbols()), summary
+
+    def _track(self, operands):
+        """
+        Registers the sentence with those of `operands` that can change,
+        so that their changes drop its cached summary.
+        """
+        for operand in operands:
+            if not operand._tracked:
+                self._tracked = False
+            if operand._mutable:
+                self._mutable = True
+                if operand._parents is None:
+                    operand._parents = weakref.WeakValueDictionary()
+                operand._parents[id(self)] = self
+
+    def _changed(self):
+        """
+        Drops the cached summaries of every sentence built on this one.
+        A sentence with no summary has none cached above it either, so
+        the walk stops there.
+        """
+        stack = [self]
+        while stack:
+            parents = stack.pop()._parents
+            if parents:
+                for parent in parents.values():
+                    if parent._cache is not None:
+                        parent._cache = None
+                        stack.append(parent)
+
+    def compile(self, symbols=None):
+        """
+        Returns a CompiledSentence evaluating the sentence as generated
+        Python code, with symbols numbered in the order of `symbols`
+        (default: sorted names of the sentence's own symbols).
+        """
+        if symbols is None:
+            symbols = sorted(self.symbols())
+        return CompiledSentence(self, symbols)
+
+    def _source(self, compiler):
+        """Returns a Python expression for the sentence."""
+        raise Exception("nothing to compile")
 
     @classmethod
     def validate(cls, sentence):
@@ -44,6 +129,9 @@ class Sentence():
 
 class Symbol(Sentence):
 
+    _mutable = False
+    _tracked = True
+
     def __init__(self, name):
         self.name = name
 
@@ -68,17 +156,32 @@ class Symbol(Sentence):
     def symbols(self):
         return {self.name}
 
+    def _summarize(self):
+        return frozenset((self.name,)), hash(("symbol", self.name))
+
+    def _source(self, compiler):
+        try:
+            index = compiler.index[self.name]
+        except KeyError:
+            raise Exception(f"variable {self.name} not in model")
+        return f"m[{index}]"
+
 
 class Not(Sentence):
+
+    _mutable = False
+    _tracked = True
+
     def __init__(self, operand):
         Sentence.validate(operand)
         self.operand = operand
+        self._track((operand,))
 
     def __eq__(self, other):
         return isinstance(other, Not) and self.operand == other.operand
 
     def __hash__(self):
-        return hash(("not", hash(self.operand)))
+        return self._summary()[1]
 
     def __repr__(self):
         return f"Not({self.operand})"
@@ -89,23 +192,32 @@ class Not(Sentence):
     def formula(self):
         return "¬" + Sentence.parenthesize(self.operand.formula())
 
-    def symbols(self):
-        return self.operand.symbols()
+    def _summarize(self):
+        symbols, operand = self.operand._summary()
+        return symbols, hash(("not", operand))
+
+    def _source(self, compiler):
+        operand = compiler.expression(self.operand)
+        if compiler.bitwise:
+            return f"(M ^ {operand})"
+        return f"(not {operand})"
 
 
 class And(Sentence):
+
+    _tracked = True
+
     def __init__(self, *conjuncts):
         for conjunct in conjuncts:
             Sentence.validate(conjunct)
         self.conjuncts = list(conjuncts)
+        self._track(self.conjuncts)
 
     def __eq__(self, other):
         return isinstance(other, And) and self.conjuncts == other.conjuncts
 
     def __hash__(self):
-        return hash(
-            ("and", tuple(hash(conjunct) for conjunct in self.conjuncts))
-        )
+        return self._summary()[1]
 
     def __repr__(self):
         conjunctions = ", ".join(
@@ -116,6 +228,20 @@ class And(Sentence):
     def add(self, conjunct):
         Sentence.validate(conjunct)
         self.conjuncts.append(conjunct)
+        self._track((conjunct,))
+        self._changed()
+
+        # Extend this conjunction's own summary rather than dropping it,
+        # so building a knowledge base one add at a time stays linear;
+        # its symbol set is its own, and only shared with the sentences
+        # whose summaries were just dropped
+        cache = self._cache
+        if cache is not None and self._tracked:
+            symbols, conjunct_hash = conjunct._summary()
+            cache[0].update(symbols)
+            self._cache = (cache[0], hash((cache[1], conjunct_hash)))
+        else:
+            self._cache = None
 
     def evaluate(self, model):
         return all(conjunct.evaluate(model) for conjunct in self.conjuncts)
@@ -126,23 +252,38 @@ class And(Sentence):
         return " ∧ ".join([Sentence.parenthesize(conjunct.formula())
                            for conjunct in self.conjuncts])
 
-    def symbols(self):
-        return set.union(*[conjunct.symbols() for conjunct in self.conjuncts])
+    def _summarize(self):
+        # Hashes fold left over the conjuncts, as add extends them
+        summaries = [conjunct._summary() for conjunct in self.conjuncts]
+        summary = hash("and")
+        for _, conjunct_hash in summaries:
+            summary = hash((summary, conjunct_hash))
+        return set().union(*[symbols for symbols, _ in summaries]), summary
+
+    def _source(self, compiler):
+        if not self.conjuncts:
+            return "M" if compiler.bitwise else "True"
+        operator = " & " if compiler.bitwise else " and "
+        return "(" + operator.join(
+            compiler.expression(conjunct) for conjunct in self.conjuncts) + ")"
 
 
 class Or(Sentence):
+
+    _mutable = False
+    _tracked = True
+
     def __init__(self, *disjuncts):
         for disjunct in disjuncts:
             Sentence.validate(disjunct)
         self.disjuncts = list(disjuncts)
+        self._track(self.disjuncts)
 
     def __eq__(self, other):
         return isinstance(other, Or) and self.disjuncts == other.disjuncts
 
     def __hash__(self):
-        return hash(
-            ("or", tuple(hash(disjunct) for disjunct in self.disjuncts))
-        )
+        return self._summary()[1]
 
     def __repr__(self):
         disjuncts = ", ".join([str(disjunct) for disjunct in self.disjuncts])
@@ -157,16 +298,30 @@ class Or(Sentence):
         return " ∨  ".join([Sentence.parenthesize(disjunct.formula())
                             for disjunct in self.disjuncts])
 
-    def symbols(self):
-        return set.union(*[disjunct.symbols() for disjunct in self.disjuncts])
+    def _summarize(self):
+        summaries = [disjunct._summary() for disjunct in self.disjuncts]
+        return (frozenset().union(*[symbols for symbols, _ in summaries]),
+                hash(("or", tuple(summary for _, summary in summaries))))
+
+    def _source(self, compiler):
+        if not self.disjuncts:
+            return "0" if compiler.bitwise else "False"
+        operator = " | " if compiler.bitwise else " or "
+        return "(" + operator.join(
+            compiler.expression(disjunct) for disjunct in self.disjuncts) + ")"
 
 
 class Implication(Sentence):
+
+    _mutable = False
+    _tracked = True
+
     def __init__(self, antecedent, consequent):
         Sentence.validate(antecedent)
         Sentence.validate(consequent)
         self.antecedent = antecedent
         self.consequent = consequent
+        self._track((antecedent, consequent))
 
     def __eq__(self, other):
         return (isinstance(other, Implication)
@@ -174,7 +329,7 @@ class Implication(Sentence):
                 and self.consequent == other.consequent)
 
     def __hash__(self):
-        return hash(("implies", hash(self.antecedent), hash(self.consequent)))
+        return self._summary()[1]
 
     def __repr__(self):
         return f"Implication({self.antecedent}, {self.consequent})"
@@ -188,16 +343,31 @@ class Implication(Sentence):
         consequent = Sentence.parenthesize(self.consequent.formula())
         return f"{antecedent} => {consequent}"
 
-    def symbols(self):
-        return set.union(self.antecedent.symbols(), self.consequent.symbols())
+    def _summarize(self):
+        antecedent, antecedent_hash = self.antecedent._summary()
+        consequent, consequent_hash = self.consequent._summary()
+        return (antecedent | consequent,
+                hash(("implies", antecedent_hash, consequent_hash)))
+
+    def _source(self, compiler):
+        antecedent = compiler.expression(self.antecedent)
+        consequent = compiler.expression(self.consequent)
+        if compiler.bitwise:
+            return f"((M ^ {antecedent}) | {consequent})"
+        return f"(not {antecedent} or {consequent})"
 
 
 class Biconditional(Sentence):
+
+    _mutable = False
+    _tracked = True
+
     def __init__(self, left, right):
         Sentence.validate(left)
         Sentence.validate(right)
         self.left = left
         self.right = right
+        self._track((left, right))
 
     def __eq__(self, other):
         return (isinstance(other, Biconditional)
@@ -205,28 +375,154 @@ class Biconditional(Sentence):
                 and self.right == other.right)
 
     def __hash__(self):
-        return hash(("biconditional", hash(self.left), hash(self.right)))
+        return self._summary()[1]
 
     def __repr__(self):
         return f"Biconditional({self.left}, {self.right})"
 
     def evaluate(self, model):
-        return ((self.left.evaluate(model)
-                 and self.right.evaluate(model))
-                or (not self.left.evaluate(model)
-                    and not self.right.evaluate(model)))
+        return self.left.evaluate(model) == self.right.evaluate(model)
 
     def formula(self):
         left = Sentence.parenthesize(str(self.left))
         right = Sentence.parenthesize(str(self.right))
         return f"{left} <=> {right}"
 
-    def symbols(self):
-        return set.union(self.left.symbols(), self.right.symbols())
-
-
-def model_check(knowledge, query):
-    """Checks if knowledge base entails query."""
+    def _summarize(self):
+        left, left_hash = self.left._summary()
+        right, right_hash = self.right._summary()
+        return (left | right,
+                hash(("biconditional", left_hash, right_hash)))
+
+    def _source(self, compiler):
+        left = compiler.expression(self.left)
+        right = compiler.expression(self.right)
+        if compiler.bitwise:
+            return f"(M ^ {left} ^ {right})"
+        return f"({left} == {right})"
+
+
+class CompiledSentence():
+    """
+    A sentence compiled to two generated Python functions over symbol
+    indexes: one evaluating a single model, the other evaluating many
+    models at once as bit-vectors, bit j of every int being model j.
+    """
+
+    def __init__(self, sentence, symbols):
+        self.symbols = list(symbols)
+        self.sentence = sentence
+        self.function = _Compiler(self.symbols, False).function(sentence)
+        self.bitwise = _Compiler(self.symbols, True).function(sentence)
+
+    def __call__(self, values):
+        """
+        Evaluates one model: a sequence of bools in symbol order, or a
+        dict from symbol name to value.
+        """
+        if isinstance(values, dict):
+            try:
+                values = [bool(values[name]) for name in self.symbols]
+            except KeyError as e:
+                raise Exception(f"variable {e.args[0]} not in model")
+        return self.function(values)
+
+    def evaluate_bits(self, columns, width):
+        """
+        Evaluates `width` models at once. columns[i] has bit j set when
+        symbol i is true in model j; bit j of the result is set when the
+        sentence is true in model j.
+        """
+        return self.bitwise(columns, (1 << width) - 1)
+
+    def evaluate_many(self, models):
+        """
+        Returns the sentence's value in each of `models` (dicts from
+        symbol name to value), evaluated as bit-vectors.
+        """
+        columns = []
+        for name in self.symbols:
+            column = 0
+            for j, model in enumerate(models):
+                try:
+                    if model[name]:
+                        column |= 1 << j
+                except KeyError:
+                    raise Exception(f"variable {name} not in model")
+            columns.append(column)
+        result = self.evaluate_bits(columns, len(models))
+        return [bool(result >> j & 1) for j in range(len(models))]
+
+
+class _Compiler():
+    """
+    Builds the source of a compiled sentence's function. Subexpressions
+    nested NESTING_LIMIT deep are hoisted into local variables, which
+    keeps generated code within the parser's nesting limit.
+    """
+
+    NESTING_LIMIT = 50
+
+    def __init__(self, symbols, bitwise):
+        self.index = {name: i for i, name in enumerate(symbols)}
+        self.bitwise = bitwise
+        self.lines = []
+        self.depth = 0
+
+    def expression(self, sentence):
+        """
+        Returns the source of a subsentence at the current depth.
+        """
+        Sentence.validate(sentence)
+        self.depth += 1
+        try:
+            source = sentence._source(self)
+        finally:
+            self.depth -= 1
+        if self.depth and self.depth % self.NESTING_LIMIT == 0:
+            name = f"t{len(self.lines)}"
+            self.lines.append(f"    {name} = {source}")
+            return name
+        return source
+
+    def function(self, sentence):
+        result = self.expression(sentence)
+        if self.bitwise:
+            header = "def evaluate(m, M):"
+        else:
+            header = "def evaluate(m):"
+            result = f"bool({result})"
+        source = "\n".join([header] + self.lines + [f"    return {result}"])
+        namespace = {}
+        exec(source, namespace)
+        return namespace["evaluate"]
+
+
+# Ways model_check can decide entailment; see sat.py for the SAT ones
+BACKENDS = ("cdcl", "dpll", "truth_table", "enumerate")
+
+# Most symbols the "truth_table" backend will enumerate: each column is
+# a 2^n-bit int, 2 MiB at 24 symbols
+TRUTH_TABLE_LIMIT = 24
+
+
+def model_check(knowledge, query, backend="enumerate"):
+    """
+    Checks if knowledge base entails query.
+
+    "enumerate", the default, checks every model of the symbols and
+    works for any Sentence subclass; "truth_table" does the same for all
+    models at once as bit-vectors, up to TRUTH_TABLE_LIMIT symbols;
+    "cdcl" and "dpll" compile to CNF and test that knowledge with not
+    query is unsatisfiable, which scales to hundreds of symbols but only
+    knows the connectives of this module.
+    """
+    if backend == "truth_table":
+        return truth_table_entails(knowledge, query)
+    if backend != "enumerate":
+        # Imported here as sat builds on the classes above
+        import sat
+        return sat.entails(knowledge, query, backend)
 
     def check_all(knowledge, query, symbols, model):
         """Checks if knowledge base entails query, given a particular model."""
@@ -261,3 +557,42 @@ def model_check(knowledge, query):
 
     # Check that knowledge entails query
     return check_all(knowledge, query, symbols, dict())
+
+
+def truth_columns(count):
+    """
+    Returns the columns of the truth table of `count` symbols, as ints
+    of 2^count bits: bit j of column i is bit i of j, so bit j across
+    the columns is model j.
+    """
+    width = 1 << count
+    columns = []
+    for i in range(count):
+        # Ones in the upper half of each 2^(i + 1)-bit period, doubled
+        # until the pattern fills the table
+        period = 1 << (i + 1)
+        column = ((1 << (period >> 1)) - 1) << (period >> 1)
+        while period < width:
+            column |= column << period
+            period <<= 1
+        columns.append(column)
+    return columns
+
+
+def truth_table_entails(knowledge, query):
+    """
+    Checks if knowledge base entails query by evaluating both in every
+    model at once: knowledge entails query when no model has knowledge
+    true and query false.
+    """
+    symbols = sorted(set.union(knowledge.symbols(), query.symbols()))
+    if len(symbols) > TRUTH_TABLE_LIMIT:
+        raise ValueError(f"{len(symbols)} symbols is too many for a "
+                         f"truth table (limit {TRUTH_TABLE_LIMIT})")
+    columns = truth_columns(len(symbols))
+    width = 1 << len(symbols)
+    known = knowledge.compile(symbols).evaluate_bits(columns, width)
+    if not known:
+        return True
+    queried = query.compile(symbols).evaluate_bits(columns, width)
+    return known & ~queried == 0
@@ -0,0 +1,655 @@
+"""
+SAT backends for logic.model_check.
+
+CNF compiles Sentence trees to clauses of integer literals (DIMACS
+style: variable v is the literal v, its negation -v), giving each
+compound subsentence a fresh variable defined by Tseitin clauses, so the
+clauses grow linearly with the sentence. Conjuncts that already are
+disjunctions of symbols become clauses directly.
+
+Two solvers decide the clauses: dpll, the classic search with unit
+propagation and pure-literal elimination, and Solver, a conflict-driven
+clause-learning solver with watched literals, activity-ordered decisions
+and restarts, which also accepts clauses and assumptions incrementally.
+Entailment KB |= query holds when KB and not query is unsatisfiable.
+
+KnowledgeBase keeps one Solver across many queries: each added sentence
+is guarded by a selector variable, so it can be retracted, and queries
+are solved under assumptions, so learned clauses carry over.
+"""
+
+import heapq
+
+from logic import And, Biconditional, Implication, Not, Or, Sentence, Symbol
+
+BACKENDS = ("cdcl", "dpll")
+
+# Conflicts before the first restart; later ones follow the Luby series
+RESTART_BASE = 100
+
+# Activity decay per conflict, as the growth of the bump increment
+ACTIVITY_DECAY = 0.95
+
+
+def entails(knowledge, query, backend="cdcl"):
+    """
+    Returns whether knowledge entails query, using `backend`.
+    """
+    cnf = CNF()
+    cnf.add(knowledge)
+    cnf.add(Not(query))
+    if backend == "cdcl":
+        return not Solver(cnf.clauses).solve()
+    elif backend == "dpll":
+        return dpll(cnf.clauses) is None
+    raise ValueError(f"unknown SAT backend {backend!r}")
+
+
+class CNF():
+    """
+    Clauses built from sentences, with a variable for each symbol name.
+    """
+
+    def __init__(self):
+        self.clauses = []
+        self.variables = {}
+        self.count = 0
+        # Literal of each compound sentence compiled so far, keyed by
+        # (hash, sentence): equal sentences share a literal, and one
+        # changed by And.add since hashes differently and gets a new one.
+        # The hash is part of the key as dicts match a key by identity
+        # before comparing hashes, which would find the stale entry
+        self.literals = {}
+
+    def fresh(self):
+        """
+        Returns a new variable.
+        """
+        self.count += 1
+        return self.count
+
+    def variable(self, name):
+        """
+        Returns the variable of the symbol `name`.
+        """
+        variable = self.variables.get(name)
+        if variable is None:
+            variable = self.variables[name] = self.fresh()
+        return variable
+
+    def add(self, sentence, guard=None):
+        """
+        Adds clauses that hold exactly when sentence does (given the
+        definitions of any fresh variables). With a `guard` literal,
+        they only hold when guard is true; definitions always hold.
+        """
+        if isinstance(sentence, And):
+            for conjunct in sentence.conjuncts:
+                self.add(conjunct, guard)
+            return
+        clause = self.clause(sentence)
+        if clause is None:
+            clause = [self.literal(sentence)]
+        if guard is not None:
+            clause.append(-guard)
+        self.clauses.append(clause)
+
+    def clause(self, sentence):
+        """
+        Returns sentence as a list of literals if it is a disjunction of
+        symbols and negated symbols, else None.
+        """
+        if isinstance(sentence, Symbol):
+            return [self.variable(sentence.name)]
+        elif isinstance(sentence, Not):
+            if isinstance(sentence.operand, Symbol):
+                return [-self.variable(sentence.operand.name)]
+            if isinstance(sentence.operand, And):
+                # Not(And(...)) is an Or of the negated conjuncts
+                return self._disjunction(
+                    [Not(conjunct) for conjunct in sentence.operand.conjuncts])
+            return None
+        elif isinstance(sentence, Or):
+            return self._disjunction(sentence.disjuncts)
+        elif isinstance(sentence, Implication):
+            return self._disjunction(
+                [Not(sentence.antecedent), sentence.consequent])
+        return None
+
+    def _disjunction(self, disjuncts):
+        literals = []
+        for disjunct in disjuncts:
+            clause = self.clause(disjunct)
+            if clause is None:
+                return None
+            literals.extend(clause)
+        return literals
+
+    def literal(self, sentence):
+        """
+        Returns a literal equivalent to sentence, adding the Tseitin
+        clauses that define it the first time sentence is seen.
+        """
+        if isinstance(sentence, Symbol):
+            return self.variable(sentence.name)
+        elif isinstance(sentence, Not):
+            return -self.literal(sentence.operand)
+
+        key = (hash(sentence), sentence)
+        known = self.literals.get(key)
+        if known is not None:
+            return known
+        if isinstance(sentence, And):
+            literal = self._gate([self.literal(c) for c in sentence.conjuncts],
+                                 conjunction=True)
+        elif isinstance(sentence, Or):
+            literal = self._gate([self.literal(d) for d in sentence.disjuncts],
+                                 conjunction=False)
+        elif isinstance(sentence, Implication):
+            literal = self._gate([-self.literal(sentence.antecedent),
+                                  self.literal(sentence.consequent)],
+                                 conjunction=False)
+        elif isinstance(sentence, Biconditional):
+            left = self.literal(sentence.left)
+            right = self.literal(sentence.right)
+            literal = self.fresh()
+            self.clauses.extend([[-literal, -left, right],
+                                 [-literal, left, -right],
+                                 [literal, left, right],
+                                 [literal, -left, -right]])
+        else:
+            raise TypeError(f"cannot compile {type(sentence).__name__}")
+        self.literals[key] = literal
+        return literal
+
+    def _gate(self, inputs, conjunction):
+        """
+        Returns a literal for the And (or Or) of the `inputs` literals.
+        """
+        if len(inputs) == 1:
+            return inputs[0]
+        # And is Not(Or) of the negated inputs
+        sign = -1 if conjunction else 1
+        inputs = [sign * literal for literal in inputs]
+        gate = self.fresh()
+        self.clauses.append([-gate] + inputs)
+        self.clauses.extend([[gate, -literal] for literal in inputs])
+        return sign * gate
+
+
+def dpll(clauses):
+    """
+    Returns a satisfying assignment {variable: bool} of `clauses`, or
+    None if there is none, by DPLL search with unit propagation and
+    pure-literal elimination.
+    """
+    stack = [([list(clause) for clause in clauses], {})]
+    while stack:
+        clauses, assignment = stack.pop()
+        clauses = _simplify_units(clauses, assignment)
+        if clauses is None:
+            continue
+        if not clauses:
+            return assignment
+
+        # A literal whose negation appears nowhere can be made true
+        literals = {literal for clause in clauses for literal in clause}
+        pure = [literal for literal in literals if -literal not in literals]
+        if pure:
+            for literal in pure:
+                assignment[abs(literal)] = literal > 0
+            pure = set(pure)
+            stack.append(([clause for clause in clauses
+                           if pure.isdisjoint(clause)], assignment))
+            continue
+
+        # Branch on the most frequent literal of the shortest clauses
+        shortest = min(len(clause) for clause in clauses)
+        counts = {}
+        for clause in clauses:
+            if len(clause) == shortest:
+                for literal in clause:
+                    counts[literal] = counts.get(literal, 0) + 1
+        literal = max(counts, key=counts.get)
+        for choice in (-literal, literal):
+            stack.append((clauses + [[choice]], dict(assignment)))
+    return None
+
+
+def _simplify_units(clauses, assignment):
+    """
+    Assigns unit clauses until none are left, recording them in
+    assignment. Returns the clauses left unsatisfied, without false
+    literals, or None on a conflict.
+    """
+    if not all(clauses):
+        return None
+    while True:
+        unit = None
+        for clause in clauses:
+            if len(clause) == 1:
+                unit = clause[0]
+                break
+        if unit is None:
+            return clauses
+        assignment[abs(unit)] = unit > 0
+        simplified = []
+        for clause in clauses:
+            if unit in clause:
+                continue
+            if -unit in clause:
+                clause = [literal for literal in clause if literal != -unit]
+                if not clause:
+                    return None
+            simplified.append(clause)
+        clauses = simplified
+
+
+class Solver():
+    """
+    CDCL SAT solver over DIMACS-style clauses. Clauses may be added
+    between calls to solve, and each call may assume some literals true;
+    learned clauses are kept for later calls.
+
+    Internally literal v is 2v and -v is 2v + 1, so negation is x ^ 1
+    and values can be looked up by literal.
+    """
+
+    def __init__(self, clauses=()):
+        self.variables = 0
+        # Per internal literal: 1 true, -1 false, 0 unassigned
+        self.values = [0, 0]
+        self.watches = [[], []]
+        # Per variable
+        self.levels = [0]
+        self.reasons = [None]
+        self.activity = [0.0]
+        self.phases = [False]
+        self.seen = [False]
+        self.heap = []
+        self.increment = 1.0
+
+        self.trail = []
+        self.trail_limits = []
+        self.head = 0
+        self.ok = True
+        self.model = None
+        self.stats = {"solves": 0, "decisions": 0, "conflicts": 0,
+                      "propagations": 0, "learned": 0, "restarts": 0}
+        for clause in clauses:
+            self.add_clause(clause)
+
+    def reserve(self, variable):
+        """
+        Makes room for variables up to `variable`.
+        """
+        while self.variables < variable:
+            self.variables += 1
+            self.values.extend((0, 0))
+            self.watches.extend(([], []))
+            self.levels.append(0)
+            self.reasons.append(None)
+            self.activity.append(0.0)
+            self.phases.append(False)
+            self.seen.append(False)
+            heapq.heappush(self.heap, (0.0, self.variables))
+
+    def add_clause(self, clause):
+        """
+        Adds a clause of DIMACS literals. Returns False once the clauses
+        are unsatisfiable whatever is assumed.
+        """
+        if not self.ok:
+            return False
+        self._backtrack(0)
+        literals = []
+        for literal in clause:
+            self.reserve(abs(literal))
+            internal = 2 * literal if literal > 0 else -2 * literal + 1
+            value = self.values[internal]
+            if value == 1 or internal ^ 1 in literals:
+                # Satisfied at the top level, or a tautology
+                return True
+            if value == 0 and internal not in literals:
+                literals.append(internal)
+        if not literals:
+            self.ok = False
+        elif len(literals) == 1:
+            self._assign(literals[0], None)
+            self.ok = self._propagate() is None
+        else:
+            self._watch(literals)
+        return self.ok
+
+    def solve(self, assumptions=()):
+        """
+        Returns whether the clauses are satisfiable with every literal in
+        `assumptions` true. If so, self.model maps each variable to its
+        value in a satisfying assignment.
+        """
+        self.model = None
+        self.stats["solves"] += 1
+        if not self.ok:
+            return False
+        assumed = []
+        for literal in assumptions:
+            self.reserve(abs(literal))
+            assumed.append(2 * literal if literal > 0 else -2 * literal + 1)
+
+        restarts = 0
+        while True:
+            limit = RESTART_BASE * _luby(restarts)
+            status = self._search(assumed, limit)
+            if status is not None:
+                break
+            restarts += 1
+            self.stats["restarts"] += 1
+        if status:
+            self.model = {variable: self.values[2 * variable] == 1
+                          for variable in range(1, self.variables + 1)}
+        self._backtrack(0)
+        return status
+
+    def value(self, literal):
+        """
+        Returns the value of a DIMACS literal in the last model.
+        """
+        return self.model[abs(literal)] == (literal > 0)
+
+    def _search(self, assumed, limit):
+        """
+        Searches until the clauses are decided, returning True or False,
+        or until `limit` conflicts, returning None to restart.
+        """
+        conflicts = 0
+        while True:
+            conflict = self._propagate()
+            if conflict is not None:
+                self.stats["conflicts"] += 1
+                conflicts += 1
+                if not self.trail_limits:
+                    self.ok = False
+                    return False
+                learned, level = self._analyze(conflict)
+                self._backtrack(level)
+                if len(learned) == 1:
+                    self._assign(learned[0], None)
+                else:
+                    self._watch(learned)
+                    self._assign(learned[0], learned)
+                    self.stats["learned"] += 1
+                self.increment /= ACTIVITY_DECAY
+                continue
+
+            if conflicts >= limit:
+                self._backtrack(0)
+                return None
+
+            level = len(self.trail_limits)
+            if level < len(assumed):
+                literal = assumed[level]
+                value = self.values[literal]
+                if value == -1:
+                    return False
+                self.trail_limits.append(len(self.trail))
+                if value == 0:
+                    self._assign(literal, None)
+                continue
+
+            literal = self._decide()
+            if literal is None:
+                return True
+            self.stats["decisions"] += 1
+            self.trail_limits.append(len(self.trail))
+            self._assign(literal, None)
+
+    def _watch(self, literals):
+        self.watches[literals[0] ^ 1].append(literals)
+        self.watches[literals[1] ^ 1].append(literals)
+
+    def _assign(self, literal, reason):
+        variable = literal >> 1
+        self.values[literal] = 1
+        self.values[literal ^ 1] = -1
+        self.levels[variable] = len(self.trail_limits)
+        self.reasons[variable] = reason
+        self.trail.append(literal)
+
+    def _propagate(self):
+        """
+        Assigns every literal forced by a clause, returning a clause
+        that became false, or None.
+
+        Each clause of two or more literals is listed under the negations
+        of its first two literals, which are kept unassigned or true
+        while the clause is not yet forced.
+        """
+        values, watches, trail = self.values, self.watches, self.trail
+        while self.head < len(trail):
+            literal = trail[self.head]
+            self.head += 1
+            self.stats["propagations"] += 1
+            false = literal ^ 1
+            watching = watches[literal]
+            kept = []
+            for index, clause in enumerate(watching):
+                if clause[0] == false:
+                    clause[0], clause[1] = clause[1], false
+                first = clause[0]
+                if values[first] == 1:
+                    kept.append(clause)
+                    continue
+                for k in range(2, len(clause)):
+                    other = clause[k]
+                    if values[other] != -1:
+                        clause[1], clause[k] = other, false
+                        watches[other ^ 1].append(clause)
+                        break
+                else:
+                    kept.append(clause)
+                    if values[first] == -1:
+                        kept.extend(watching[index + 1:])
+                        watches[literal] = kept
+                        self.head = len(trail)
+                        return clause
+                    self._assign(first, clause)
+            watches[literal] = kept
+        return None
+
+    def _analyze(self, conflict):
+        """
+        Returns (learned clause, level to backtrack to) for a conflict,
+        learning the first unique implication point clause.
+        """
+        seen, levels, reasons = self.seen, self.levels, self.reasons
+        level = len(self.trail_limits)
+        learned = [None]
+        pending = 0
+        index = len(self.trail) - 1
+        clause = conflict
+        literal = None
+        while True:
+            for other in (clause if literal is None else clause[1:]):
+                variable = other >> 1
+                if not seen[variable] and levels[variable] > 0:
+                    seen[variable] = True
+                    self._bump(variable)
+                    if levels[variable] == level:
+                        pending += 1
+                    else:
+                        learned.append(other)
+            while not seen[self.trail[index] >> 1]:
+                index -= 1
+            literal = self.trail[index]
+            index -= 1
+            variable = literal >> 1
+            seen[variable] = False
+            pending -= 1
+            if not pending:
+                break
+            clause = reasons[variable]
+        learned[0] = literal ^ 1
+        for other in learned[1:]:
+            seen[other >> 1] = False
+
+        if len(learned) == 1:
+            return learned, 0
+        # Watch the literal from the highest remaining level second
+        best = max(range(1, len(learned)),
+                   key=lambda i: levels[learned[i] >> 1])
+        learned[1], learned[best] = learned[best], learned[1]
+        return learned, levels[learned[1] >> 1]
+
+    def _backtrack(self, level):
+        if len(self.trail_limits) <= level:
+            return
+        start = self.trail_limits[level]
+        for literal in self.trail[start:]:
+            variable = literal >> 1
+            self.values[literal] = self.values[literal ^ 1] = 0
+            self.reasons[variable] = None
+            self.phases[variable] = literal & 1 == 0
+            heapq.heappush(self.heap, (-self.activity[variable], variable))
+        del self.trail[start:]
+        del self.trail_limits[level:]
+        self.head = start
+
+    def _bump(self, variable):
+        self.activity[variable] += self.increment
+        if self.activity[variable] > 1e100:
+            self.activity = [activity * 1e-100 for activity in self.activity]
+            self.increment *= 1e-100
+            self.heap = [(-activity, v)
+                         for v, activity in enumerate(self.activity) if v]
+            heapq.heapify(self.heap)
+        elif self.values[2 * variable] == 0:
+            heapq.heappush(self.heap, (-self.activity[variable], variable))
+
+    def _decide(self):
+        """
+        Returns the saved phase of the most active unassigned variable,
+        or None if all are assigned.
+        """
+        heap, values = self.heap, self.values
+        if len(heap) > 8 * self.variables:
+            # Drop the stale entries left by lazy updates
+            heap[:] = [(-self.activity[v], v)
+                       for v in range(1, self.variables + 1)
+                       if values[2 * v] == 0]
+            heapq.heapify(heap)
+        while heap:
+            _, variable = heapq.heappop(heap)
+            if values[2 * variable] == 0:
+                return 2 * variable + (0 if self.phases[variable] else 1)
+        for variable in range(1, self.variables + 1):
+            if values[2 * variable] == 0:
+                return 2 * variable + (0 if self.phases[variable] else 1)
+        return None
+
+
+class KnowledgeBase():
+    """
+    Sentences held by one incremental Solver, for asking many entailment
+    queries of the same knowledge. Sentences can be added and retracted
+    between queries; clauses learned by one query help the next.
+    """
+
+    def __init__(self, *sentences):
+        self.cnf = CNF()
+        self.solver = Solver()
+        # Clauses of cnf already given to the solver
+        self.loaded = 0
+        # Sentence added under each selector variable not yet retracted
+        self.sentences = {}
+        for sentence in sentences:
+            self.add(sentence)
+
+    def add(self, sentence):
+        """
+        Adds sentence to the knowledge, returning a handle to retract it
+        with. The sentence is compiled as it is now: to take later
+        changes to it into account, retract it and add it again.
+        """
+        Sentence.validate(sentence)
+        selector = self.cnf.fresh()
+        self.cnf.add(sentence, guard=selector)
+        self._load()
+        self.sentences[selector] = sentence
+        return selector
+
+    def retract(self, handle):
+        """
+        Removes the sentence added with `handle` from the knowledge.
+        """
+        if self.sentences.pop(handle, None) is None:
+            raise KeyError(f"no sentence with handle {handle}")
+        # Its clauses are now satisfied for good
+        self.solver.add_clause([-handle])
+
+    def entails(self, query):
+        """
+        Returns whether the knowledge entails query.
+        """
+        Sentence.validate(query)
+        literal = self.cnf.literal(query)
+        self._load()
+        return not self._solve(-literal)
+
+    def entailed_symbols(self, symbols):
+        """
+        Returns those of `symbols` that the knowledge entails, in order.
+
+        Symbols false in any model found along the way are ruled out
+        without a query of their own, so this takes one solve for each
+        entailed symbol plus one for each model needed.
+        """
+        variables = [self.cnf.variable(symbol.name) for symbol in symbols]
+        self.solver.reserve(self.cnf.count)
+        if not self._solve():
+            # Inconsistent knowledge entails everything
+            return list(symbols)
+        candidates = {variable for variable in variables
+                      if self.solver.model[variable]}
+        entailed = set()
+        while candidates:
+            variable = candidates.pop()
+            if self._solve(-variable):
+                model = self.solver.model
+                candidates = {candidate for candidate in candidates
+                              if model[candidate]}
+            else:
+                entailed.add(variable)
+        return [symbol for symbol, variable in zip(symbols, variables)
+                if variable in entailed]
+
+    def _load(self):
+        """
+        Gives the solver the clauses compiled since the last call.
+        """
+        clauses = self.cnf.clauses
+        for clause in clauses[self.loaded:]:
+            self.solver.add_clause(clause)
+        self.loaded = len(clauses)
+        self.solver.reserve(self.cnf.count)
+
+    def _solve(self, *literals):
+        """
+        Returns whether the knowledge is satisfiable with `literals`
+        true.
+        """
+        return self.solver.solve(list(self.sentences) + list(literals))
+
+
+def _luby(i):
+    """
+    Returns the i-th term (from 0) of the Luby series 1 1 2 1 1 2 4 ...
+    """
+    size, power = 1, 0
+    while size < i + 1:
+        power += 1
+        size = 2 * size + 1
+    while size - 1 != i:
+        size = (size - 1) // 2
+        power -= 1
+        i %= size
+    return 1 << power